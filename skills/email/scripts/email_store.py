@@ -0,0 +1,169 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uidnext INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    highestmodseq INTEGER,
+    window_size INTEGER NOT NULL,
+    PRIMARY KEY (account, mailbox)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    date TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    flags TEXT NOT NULL,
+    PRIMARY KEY (account, mailbox, uidvalidity, uid)
+);
+CREATE TABLE IF NOT EXISTS capabilities (
+    account TEXT PRIMARY KEY,
+    names TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inbox_indices (
+    item_key TEXT PRIMARY KEY,
+    item_index INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+STATE_FIELDS = ("uidvalidity", "uidnext", "messages", "highestmodseq", "window_size")
+
+
+class HeaderStore:
+    """Local copy of the newest INBOX headers, keyed by (account, mailbox, UIDVALIDITY, UID)."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def mailbox_state(self, account: str, mailbox: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT * FROM mailboxes WHERE account = ? AND mailbox = ?",
+            (account, mailbox),
+        ).fetchone()
+        if row is None:
+            return None
+        return {field: row[field] for field in STATE_FIELDS}
+
+    def capabilities(self, account: str) -> Optional[List[str]]:
+        row = self.conn.execute("SELECT names FROM capabilities WHERE account = ?", (account,)).fetchone()
+        return row["names"].split() if row else None
+
+    def save_capabilities(self, account: str, names: List[str]) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO capabilities VALUES (?, ?)", (account, " ".join(names)))
+
+    def known_uids(self, account: str, mailbox: str, uidvalidity: int) -> Set[int]:
+        rows = self.conn.execute(
+            "SELECT uid FROM messages WHERE account = ? AND mailbox = ? AND uidvalidity = ?",
+            (account, mailbox, uidvalidity),
+        )
+        return {row["uid"] for row in rows}
+
+    def replace_window(
+        self,
+        account: str,
+        mailbox: str,
+        state: dict,
+        flags_by_uid: Dict[int, str],
+        headers_by_uid: Dict[int, dict],
+    ) -> None:
+        """Keep exactly the messages in the current window and record the mailbox state.
+
+        A window with UIDs that still lack headers is recorded with window_size 0,
+        so the next sync cannot take the no-change path and fetches them again.
+        """
+        uidvalidity = state["uidvalidity"]
+        known = self.known_uids(account, mailbox, uidvalidity)
+        if any(uid not in known and uid not in headers_by_uid for uid in flags_by_uid):
+            state = {**state, "window_size": 0}
+        with self.conn:
+            stale = self.conn.execute(
+                "SELECT uidvalidity, uid FROM messages WHERE account = ? AND mailbox = ?",
+                (account, mailbox),
+            ).fetchall()
+            self.conn.executemany(
+                "DELETE FROM messages WHERE account = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                [
+                    (account, mailbox, row["uidvalidity"], row["uid"])
+                    for row in stale
+                    if row["uidvalidity"] != uidvalidity or row["uid"] not in flags_by_uid
+                ],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        account,
+                        mailbox,
+                        uidvalidity,
+                        uid,
+                        headers["from"],
+                        headers["subject"],
+                        headers["date"],
+                        headers["message_id"],
+                        flags_by_uid.get(uid, ""),
+                    )
+                    for uid, headers in headers_by_uid.items()
+                ],
+            )
+            self.conn.executemany(
+                "UPDATE messages SET flags = ? WHERE account = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                [
+                    (flags, account, mailbox, uidvalidity, uid)
+                    for uid, flags in flags_by_uid.items()
+                    if uid not in headers_by_uid
+                ],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account, mailbox, *(state[field] for field in STATE_FIELDS)),
+            )
+
+    def latest(self, account: str, mailbox: str, limit: int) -> List[sqlite3.Row]:
+        return self.conn.execute(
+            """
+            SELECT m.* FROM messages m
+            JOIN mailboxes b ON b.account = m.account AND b.mailbox = m.mailbox AND b.uidvalidity = m.uidvalidity
+            WHERE m.account = ? AND m.mailbox = ?
+            ORDER BY m.uid DESC
+            LIMIT ?
+            """,
+            (account, mailbox, limit),
+        ).fetchall()
+
+    def load_indices(self) -> Optional[Tuple[int, dict]]:
+        row = self.conn.execute("SELECT value FROM settings WHERE name = 'next_index'").fetchone()
+        if row is None:
+            return None
+        active = {key: index for key, index in self.conn.execute("SELECT item_key, item_index FROM inbox_indices")}
+        return row["value"], active
+
+    def save_indices(self, next_index: int, active: Dict[str, int]) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM inbox_indices")
+            self.conn.executemany("INSERT INTO inbox_indices VALUES (?, ?)", active.items())
+            self.conn.execute(
+                "INSERT OR REPLACE INTO settings VALUES ('next_index', ?)",
+                (next_index,),
+            )
+
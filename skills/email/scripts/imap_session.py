@@ -0,0 +1,357 @@
+import functools
+import hashlib
+import imaplib
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Iterable
+
+ICLOUD_HOST = "imap.mail.me.com"
+ICLOUD_PORT = 993
+BROKER_DIR = Path(os.path.expanduser("~/.cache/aipal/imap-broker"))
+IDLE_TIMEOUT_SECONDS = 600
+CONNECT_TIMEOUT_SECONDS = 60
+REAP_INTERVAL_SECONDS = 15
+# Commands a borrowed connection may run. LOGIN/LOGOUT stay with the broker.
+PROXIED_COMMANDS = {
+    "append",
+    "capability",
+    "close",
+    "copy",
+    "expunge",
+    "fetch",
+    "list",
+    "noop",
+    "search",
+    "select",
+    "status",
+    "store",
+    "uid",
+}
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    """Compress UIDs into an IMAP sequence set such as 3:5,9."""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def server_capabilities(m):
+    """Ask for CAPABILITY after login; the greeting may omit extensions announced only then."""
+    typ, data = m.capability()
+    if typ == "OK" and data and data[0]:
+        return data[0].decode("ascii", errors="replace").upper().split()
+    return [str(cap).upper() for cap in m.capabilities]
+
+
+def _socket_path(broker_dir: Path) -> str:
+    return str(broker_dir / "broker.sock")
+
+
+def _key_path(broker_dir: Path) -> Path:
+    return broker_dir / "broker.key"
+
+
+def _password_digest(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def _raise_remote(kind: str, message: str):
+    if kind == "readonly":
+        raise imaplib.IMAP4.readonly(message)
+    if kind == "abort":
+        raise imaplib.IMAP4.abort(message)
+    raise imaplib.IMAP4.error(message)
+
+
+def _receive(conn, timeout):
+    if timeout is not None and not conn.poll(timeout):
+        raise imaplib.IMAP4.abort(f"IMAP broker did not answer within {timeout:g}s")
+    return conn.recv()
+
+
+def connect_broker(broker_dir: Path = None):
+    """Return a connection to the running broker, or None when it is not running."""
+    broker_dir = broker_dir or BROKER_DIR
+    try:
+        authkey = _key_path(broker_dir).read_bytes()
+        return Client(_socket_path(broker_dir), family="AF_UNIX", authkey=authkey)
+    except (OSError, EOFError, AuthenticationError):
+        return None
+
+
+class BrokeredIMAP:
+    """imaplib-style proxy for an authenticated connection held by the broker."""
+
+    def __init__(self, conn, capabilities, timeout=CONNECT_TIMEOUT_SECONDS):
+        self._conn = conn
+        self._timeout = timeout
+        self._broken = False
+        self.capabilities = tuple(capabilities)
+
+    def _request(self, *message):
+        try:
+            self._conn.send(message)
+            reply = _receive(self._conn, self._timeout)
+        except imaplib.IMAP4.abort:
+            self._broken = True
+            raise
+        except (OSError, EOFError) as exc:
+            self._broken = True
+            raise imaplib.IMAP4.abort(f"IMAP broker connection lost: {exc}")
+        if reply[0] == "error":
+            _raise_remote(reply[1], reply[2])
+        return reply[1]
+
+    def _call(self, name, *args, **kwargs):
+        return self._request("call", name, args, kwargs)
+
+    def __getattr__(self, name):
+        if name not in PROXIED_COMMANDS:
+            raise AttributeError(name)
+        return functools.partial(self._call, name)
+
+    def release(self) -> None:
+        # After a timeout the broker may still be busy with the old command;
+        # closing our end makes it discard that connection instead.
+        try:
+            if not self._broken:
+                self._request("release")
+        except imaplib.IMAP4.error:
+            pass
+        finally:
+            self._conn.close()
+
+
+@contextmanager
+def imap_session(user, password, host=ICLOUD_HOST, port=ICLOUD_PORT, timeout=CONNECT_TIMEOUT_SECONDS):
+    """Borrow a logged-in IMAP connection from the broker, or log in directly."""
+    conn = connect_broker()
+    if conn is not None:
+        try:
+            conn.send(("open", host, port, user, password))
+            reply = _receive(conn, timeout)
+        except (OSError, EOFError):
+            conn.close()
+            conn = None
+        except imaplib.IMAP4.abort:
+            conn.close()
+            raise
+    if conn is not None:
+        if reply[0] == "error":
+            conn.close()
+            _raise_remote(reply[1], reply[2])
+        session = BrokeredIMAP(conn, reply[1], timeout)
+        try:
+            yield session
+        finally:
+            session.release()
+        return
+
+    m = imaplib.IMAP4_SSL(host, port, timeout=timeout)
+    try:
+        m.login(user, password)
+        yield m
+    finally:
+        try:
+            m.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+
+class Broker:
+    """Keeps authenticated IMAP connections warm per account and lends them out."""
+
+    def __init__(self, broker_dir: Path = None, idle_timeout: float = IDLE_TIMEOUT_SECONDS):
+        self.broker_dir = broker_dir or BROKER_DIR
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.stopping = False
+        self.listener = None
+
+    def _connect(self, host, port, user, password):
+        m = imaplib.IMAP4_SSL(host, port, timeout=CONNECT_TIMEOUT_SECONDS)
+        m.login(user, password)
+        return m
+
+    def borrow(self, host, port, user, password):
+        key = (host, port, user, _password_digest(password))
+        while True:
+            with self.lock:
+                pooled = self.idle.get(key)
+                m = pooled.pop()[0] if pooled else None
+            if m is None:
+                return key, self._connect(host, port, user, password)
+            try:
+                m.noop()
+            except (imaplib.IMAP4.error, OSError):
+                self._logout(m)
+                continue
+            return key, m
+
+    def give_back(self, key, m) -> None:
+        with self.lock:
+            self.idle.setdefault(key, []).append((m, time.monotonic()))
+
+    def _logout(self, m) -> None:
+        try:
+            m.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+    def reap(self) -> bool:
+        """Log out connections idle past the timeout; return True when the broker should exit."""
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for key, pooled in list(self.idle.items()):
+                keep = [(m, since) for m, since in pooled if now - since < self.idle_timeout]
+                expired.extend(m for m, since in pooled if now - since >= self.idle_timeout)
+                if keep:
+                    self.idle[key] = keep
+                else:
+                    del self.idle[key]
+            done = not self.idle and not self.active and now - self.last_activity >= self.idle_timeout
+        for m in expired:
+            self._logout(m)
+        return done
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "active": self.active,
+                "idle": {key[2]: len(pooled) for key, pooled in self.idle.items()},
+            }
+
+    def handle(self, conn) -> None:
+        key = None
+        m = None
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (OSError, EOFError):
+                    break
+                command = message[0]
+                if command == "status":
+                    conn.send(("ok", self.status()))
+                elif command == "stop":
+                    conn.send(("ok", None))
+                    self.stop()
+                elif command == "open" and key is None:
+                    try:
+                        key, m = self.borrow(*message[1:])
+                    except imaplib.IMAP4.error as exc:
+                        conn.send(("error", "error", str(exc)))
+                    except OSError as exc:
+                        conn.send(("error", "abort", str(exc)))
+                    else:
+                        with self.lock:
+                            self.active += 1
+                        conn.send(("ok", tuple(m.capabilities)))
+                elif command == "call" and m is not None and message[1] in PROXIED_COMMANDS:
+                    try:
+                        result = getattr(m, message[1])(*message[2], **message[3])
+                    except imaplib.IMAP4.readonly as exc:
+                        conn.send(("error", "readonly", str(exc)))
+                    except imaplib.IMAP4.abort as exc:
+                        self._logout(m)
+                        m = None
+                        conn.send(("error", "abort", str(exc)))
+                    except imaplib.IMAP4.error as exc:
+                        conn.send(("error", "error", str(exc)))
+                    except OSError as exc:
+                        self._logout(m)
+                        m = None
+                        conn.send(("error", "abort", str(exc)))
+                    else:
+                        conn.send(("ok", result))
+                elif command == "release":
+                    if m is not None:
+                        self.give_back(key, m)
+                        m = None
+                    conn.send(("ok", None))
+                    break
+                else:
+                    conn.send(("error", "error", f"unexpected broker request: {command}"))
+        except (OSError, EOFError):
+            # The client gave up (for example after its timeout) before the reply.
+            pass
+        finally:
+            # A client that vanished mid-session may have left a command half done.
+            if m is not None:
+                self._logout(m)
+            conn.close()
+            with self.lock:
+                if key is not None:
+                    self.active -= 1
+                self.last_activity = time.monotonic()
+
+    def _reap_loop(self) -> None:
+        while not self.stopping:
+            time.sleep(min(REAP_INTERVAL_SECONDS, self.idle_timeout))
+            if self.reap():
+                self.stop()
+
+    def stop(self) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        # Wake the accept() in serve() so it can notice the flag.
+        conn = connect_broker(self.broker_dir)
+        if conn is not None:
+            conn.close()
+
+    def serve(self) -> None:
+        self.broker_dir.mkdir(parents=True, exist_ok=True)
+        os.chmod(self.broker_dir, 0o700)
+        existing = connect_broker(self.broker_dir)
+        if existing is not None:
+            existing.close()
+            raise SystemExit(f"IMAP broker already running at {_socket_path(self.broker_dir)}")
+        socket_path = _socket_path(self.broker_dir)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        authkey = secrets.token_bytes(32)
+        key_path = _key_path(self.broker_dir)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(authkey)
+
+        self.listener = Listener(socket_path, family="AF_UNIX", authkey=authkey)
+        threading.Thread(target=self._reap_loop, daemon=True).start()
+        try:
+            while not self.stopping:
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    continue
+                if self.stopping:
+                    conn.close()
+                    break
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            with self.lock:
+                pooled = [m for entries in self.idle.values() for m, _since in entries]
+                self.idle.clear()
+            for m in pooled:
+                self._logout(m)
+            try:
+                key_path.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,79 @@
+import contextlib
+import importlib.util
+from importlib.machinery import SourceFileLoader
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+loader = SourceFileLoader("email_archive", str(SCRIPT_DIR / "email-archive"))
+spec = importlib.util.spec_from_loader("email_archive", loader)
+email_archive = importlib.util.module_from_spec(spec)
+assert spec.loader is not None
+spec.loader.exec_module(email_archive)
+
+
+class EmailArchiveTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_path = pathlib.Path(tmp.name) / "archive.json"
+        for patch in (
+            mock.patch.object(email_archive, "ARCHIVE_CACHE_PATH", self.cache_path),
+            mock.patch.dict("os.environ", {"ICLOUD_APP_PASSWORD": "secret"}),
+            mock.patch("builtins.print"),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _archive(self, m, uids):
+        with mock.patch.object(email_archive, "imap_session", return_value=contextlib.nullcontext(m)):
+            email_archive._archive_icloud("me@icloud.com", uids, None)
+
+    def test_moves_a_compressed_uid_set_and_caches_the_archive_mailbox(self):
+        m = mock.Mock()
+        m.capability.return_value = ("OK", [b"IMAP4rev1 MOVE UIDPLUS"])
+        m.list.return_value = ("OK", [b'(\\HasNoChildren \\Archive) "/" "Archive"'])
+        m.uid.return_value = ("OK", [None])
+
+        self._archive(m, ["12", "10", "11", "15"])
+
+        m.uid.assert_called_once_with("MOVE", "10:12,15", "Archive")
+        cached = json.loads(self.cache_path.read_text())["me@icloud.com"]
+        self.assertEqual(cached["mailbox"], "Archive")
+
+        second = mock.Mock()
+        second.uid.return_value = ("OK", [None])
+        self._archive(second, ["20"])
+
+        second.capability.assert_not_called()
+        second.list.assert_not_called()
+        second.uid.assert_called_once_with("MOVE", "20", "Archive")
+
+    def test_falls_back_to_one_set_based_copy_store_and_uid_expunge(self):
+        m = mock.Mock()
+        m.capability.return_value = ("OK", [b"IMAP4rev1 UIDPLUS"])
+        m.list.return_value = ("OK", [b'(\\HasNoChildren) "/" "Old Mail"', b'(\\HasNoChildren) "/" "Archivo"'])
+        m.uid.return_value = ("OK", [None])
+
+        self._archive(m, ["3", "4"])
+
+        self.assertEqual(
+            m.uid.call_args_list,
+            [
+                mock.call("COPY", "3:4", "Archivo"),
+                mock.call("STORE", "3:4", "+FLAGS.SILENT", "(\\Deleted)"),
+                mock.call("EXPUNGE", "3:4"),
+            ],
+        )
+        m.expunge.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import contextlib
+import importlib.util
+from importlib.machinery import SourceFileLoader
+import pathlib
+import sys
+import unittest
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+loader = SourceFileLoader("email_reply", str(SCRIPT_DIR / "email-reply"))
+spec = importlib.util.spec_from_loader("email_reply", loader)
+email_reply = importlib.util.module_from_spec(spec)
+assert spec.loader is not None
+spec.loader.exec_module(email_reply)
+
+
+class EmailReplyTests(unittest.TestCase):
+    def test_fetches_icloud_message_through_a_session(self):
+        m = mock.Mock()
+        m.uid.return_value = (
+            "OK",
+            [(b"1 (UID 7 BODY[] {60}", b"From: Ann <a@x.com>\r\nSubject: hi\r\nMessage-ID: <1@x>\r\n\r\nbody\r\n"), b")"],
+        )
+
+        with mock.patch.dict("os.environ", {"ICLOUD_APP_PASSWORD": "secret"}), mock.patch.object(
+            email_reply, "imap_session", return_value=contextlib.nullcontext(m)
+        ) as session:
+            msg, password = email_reply._fetch_icloud_message("me@icloud.com", "7")
+
+        session.assert_called_once_with(
+            "me@icloud.com", "secret", email_reply.ICLOUD_IMAP_HOST, email_reply.ICLOUD_IMAP_PORT
+        )
+        m.select.assert_called_once_with("INBOX", readonly=True)
+        self.assertEqual(password, "secret")
+        self.assertEqual(msg["Subject"], "hi")
+        self.assertEqual(msg["Message-ID"], "<1@x>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from multiprocessing import Pipe
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import imap_session  # noqa: E402
+
+
+class FakeIMAP:
+    logins = 0
+    logouts = 0
+
+    def __init__(self, host, port, timeout=None):
+        self.capabilities = ("IMAP4REV1", "CONDSTORE")
+
+    def login(self, user, password):
+        FakeIMAP.logins += 1
+        return "OK", [b"LOGIN completed"]
+
+    def noop(self):
+        return "OK", [b"NOOP completed"]
+
+    def select(self, mailbox, readonly=False):
+        return "OK", [b"3" if readonly else b"0"]
+
+    def uid(self, command, *args):
+        return "OK", [(b"1 (UID 5 BODY[] {3}", b"abc"), b")"]
+
+    def logout(self):
+        FakeIMAP.logouts += 1
+        return "BYE", [b"bye"]
+
+
+class ImapSessionTests(unittest.TestCase):
+    def setUp(self):
+        FakeIMAP.logins = 0
+        FakeIMAP.logouts = 0
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.broker_dir = pathlib.Path(tmp.name)
+        for patch in (
+            mock.patch.object(imap_session.imaplib, "IMAP4_SSL", FakeIMAP),
+            mock.patch.object(imap_session, "BROKER_DIR", self.broker_dir),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_falls_back_to_a_direct_login_without_broker(self):
+        with imap_session.imap_session("me@icloud.com", "secret") as m:
+            self.assertIsInstance(m, FakeIMAP)
+
+        self.assertEqual((FakeIMAP.logins, FakeIMAP.logouts), (1, 1))
+
+    def test_broker_reuses_one_login_across_sessions(self):
+        broker = imap_session.Broker(self.broker_dir, idle_timeout=60)
+        thread = threading.Thread(target=broker.serve)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(broker.stop)
+        while imap_session.connect_broker() is None:
+            thread.join(0.01)
+
+        for _ in range(3):
+            with imap_session.imap_session("me@icloud.com", "secret") as m:
+                self.assertEqual(m.capabilities, ("IMAP4REV1", "CONDSTORE"))
+                self.assertEqual(m.select("INBOX", readonly=True), ("OK", [b"3"]))
+                self.assertEqual(m.uid("fetch", "5", "(BODY.PEEK[])")[1][0][1], b"abc")
+                with self.assertRaises(AttributeError):
+                    m.logout
+
+        self.assertEqual((FakeIMAP.logins, FakeIMAP.logouts), (1, 0))
+        self.assertEqual(broker.status()["idle"], {"me@icloud.com": 1})
+
+
+    def test_broker_requests_respect_the_session_timeout(self):
+        client, _silent_broker = Pipe()
+        with mock.patch.object(imap_session, "connect_broker", return_value=client):
+            started = time.monotonic()
+            with self.assertRaises(imap_session.imaplib.IMAP4.abort):
+                with imap_session.imap_session("me@icloud.com", "secret", timeout=0.1):
+                    pass
+        self.assertLess(time.monotonic() - started, 2)
+
+        client, silent_broker = Pipe()
+        session = imap_session.BrokeredIMAP(client, ("IMAP4REV1",), timeout=0.1)
+        started = time.monotonic()
+        with self.assertRaises(imap_session.imaplib.IMAP4.abort):
+            session.select("INBOX", readonly=True)
+        session.release()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(silent_broker.recv()[1], "select")
+        with self.assertRaises(EOFError):
+            silent_broker.recv()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import importlib.util
+from importlib.machinery import SourceFileLoader
+import pathlib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+loader = SourceFileLoader("inbox", str(SCRIPT_DIR / "inbox"))
+spec = importlib.util.spec_from_loader("inbox", loader)
+inbox = importlib.util.module_from_spec(spec)
+assert spec.loader is not None
+spec.loader.exec_module(inbox)
+
+import email_store  # noqa: E402
+
+
+class InboxTests(unittest.TestCase):
+    def test_parses_multi_message_fetch_with_uid_before_or_after_literal(self):
+        data = [
+            (b"1 (UID 41 BODY[HEADER.FIELDS (FROM SUBJECT)] {18}", b"Subject: first\r\n\r\n"),
+            b")",
+            (b"2 (BODY[HEADER.FIELDS (FROM SUBJECT)] {19}", b"Subject: second\r\n\r\n"),
+            b" UID 42)",
+        ]
+
+        parsed = list(inbox.iter_fetched_headers(data))
+
+        self.assertEqual(
+            parsed,
+            [(b"41", b"Subject: first\r\n\r\n"), (b"42", b"Subject: second\r\n\r\n")],
+        )
+
+    def _imap(self, uidnext):
+        m = mock.Mock()
+        # CONDSTORE is only announced after login, as some servers do.
+        m.capabilities = ("IMAP4REV1",)
+        m.capability.return_value = ("OK", [b"IMAP4rev1 CONDSTORE UIDPLUS"])
+        m.status.return_value = (
+            "OK",
+            [f"INBOX (MESSAGES 250 UIDNEXT {uidnext} UIDVALIDITY 7 HIGHESTMODSEQ 55)".encode()],
+        )
+        m.select.return_value = ("OK", [b"250"])
+        m.fetch.return_value = (
+            "OK",
+            [b"249 (UID 900 FLAGS (\\Seen))", b"250 (UID 901 FLAGS ())"],
+        )
+        m.uid.return_value = (
+            "OK",
+            [
+                (b"249 (UID 900 BODY[...] {40}", b"From: Ann <a@x.com>\r\nSubject: older\r\n\r\n"),
+                b")",
+                (b"250 (UID 901 BODY[...] {40}", b"From: Bob <b@x.com>\r\nSubject: newer\r\n\r\n"),
+                b")",
+            ],
+        )
+        return m
+
+    def test_syncs_new_headers_once_and_then_only_checks_status(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = email_store.HeaderStore(pathlib.Path(tmp) / "store.sqlite3")
+            m = self._imap(uidnext=902)
+
+            self.assertTrue(inbox.sync_icloud_inbox(m, store, "me@icloud.com", 2))
+            m.status.assert_called_once_with("INBOX", "(MESSAGES UIDNEXT UIDVALIDITY HIGHESTMODSEQ)")
+            m.fetch.assert_called_once_with("249:250", "(UID FLAGS)")
+            m.uid.assert_called_once_with("fetch", "900:901", inbox.HEADER_FETCH)
+
+            again = self._imap(uidnext=902)
+            self.assertFalse(inbox.sync_icloud_inbox(again, store, "me@icloud.com", 2))
+            again.select.assert_not_called()
+            again.capability.assert_not_called()
+
+            flag_change = self._imap(uidnext=902)
+            flag_change.status.return_value = (
+                "OK",
+                [b"INBOX (MESSAGES 250 UIDNEXT 902 UIDVALIDITY 7 HIGHESTMODSEQ 56)"],
+            )
+            flag_change.fetch.return_value = ("OK", [b"249 (UID 900 FLAGS (\\Seen))", b"250 (UID 901 FLAGS (\\Seen))"])
+            self.assertTrue(inbox.sync_icloud_inbox(flag_change, store, "me@icloud.com", 2))
+            flag_change.uid.assert_not_called()
+
+            rows = store.latest("me@icloud.com", "INBOX", 2)
+            self.assertEqual([(row["uid"], row["sender"]) for row in rows], [(901, "Bob"), (900, "Ann")])
+            self.assertEqual(rows[0]["flags"], "\\Seen")
+            self.assertEqual(rows[1]["flags"], "\\Seen")
+            store.close()
+
+    def test_incremental_sync_fetches_only_unknown_uids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = email_store.HeaderStore(pathlib.Path(tmp) / "store.sqlite3")
+            inbox.sync_icloud_inbox(self._imap(uidnext=902), store, "me@icloud.com", 2)
+
+            m = self._imap(uidnext=903)
+            m.fetch.return_value = ("OK", [b"249 (UID 901 FLAGS (\\Seen))", b"250 (UID 902 FLAGS ())"])
+            m.uid.return_value = (
+                "OK",
+                [(b"250 (UID 902 BODY[...] {40}", b"From: Cy <c@x.com>\r\nSubject: newest\r\n\r\n"), b")"],
+            )
+
+            self.assertTrue(inbox.sync_icloud_inbox(m, store, "me@icloud.com", 2))
+
+            m.uid.assert_called_once_with("fetch", "902", inbox.HEADER_FETCH)
+            rows = store.latest("me@icloud.com", "INBOX", 5)
+            self.assertEqual([(row["uid"], row["flags"]) for row in rows], [(902, ""), (901, "\\Seen")])
+            store.close()
+
+    def test_retries_uids_whose_headers_did_not_arrive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = email_store.HeaderStore(pathlib.Path(tmp) / "store.sqlite3")
+            m = self._imap(uidnext=902)
+            m.uid.return_value = ("OK", m.uid.return_value[1][:2])
+
+            self.assertTrue(inbox.sync_icloud_inbox(m, store, "me@icloud.com", 2))
+
+            retry = self._imap(uidnext=902)
+            self.assertTrue(inbox.sync_icloud_inbox(retry, store, "me@icloud.com", 2))
+            retry.uid.assert_called_once_with("fetch", "901", inbox.HEADER_FETCH)
+            rows = store.latest("me@icloud.com", "INBOX", 2)
+            self.assertEqual([row["uid"] for row in rows], [901, 900])
+            self.assertFalse(inbox.sync_icloud_inbox(self._imap(uidnext=902), store, "me@icloud.com", 2))
+            store.close()
+
+    def test_fetches_sources_concurrently_in_configured_order(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(1)
+            return [{"id": "slow"}]
+
+        def failing():
+            raise RuntimeError("gog error")
+
+        def fast():
+            release.set()
+            return [{"id": "fast"}]
+
+        def stuck():
+            time.sleep(0.5)
+            return []
+
+        results = inbox.fetch_sources(
+            [("gmail", "a", slow), ("gmail", "b", failing), ("icloud", "c", fast), ("gmail", "d", stuck)],
+            timeout=0.2,
+        )
+
+        self.assertEqual(
+            results,
+            [
+                ("gmail", "a", [{"id": "slow"}], None),
+                ("gmail", "b", [], "gog error"),
+                ("icloud", "c", [{"id": "fast"}], None),
+                ("gmail", "d", [], "timed out after 0.2s"),
+            ],
+        )
+
+    def test_hung_source_does_not_keep_the_process_alive_past_the_deadline(self):
+        script = (
+            "import importlib.util, sys, time\n"
+            "from importlib.machinery import SourceFileLoader\n"
+            f"sys.path.insert(0, {str(SCRIPT_DIR)!r})\n"
+            f"loader = SourceFileLoader('inbox', {str(SCRIPT_DIR / 'inbox')!r})\n"
+            "inbox = importlib.util.module_from_spec(importlib.util.spec_from_loader('inbox', loader))\n"
+            "loader.exec_module(inbox)\n"
+            "print(inbox.fetch_sources([('icloud', 'me', lambda: time.sleep(60))], timeout=0.2))\n"
+        )
+        started = time.monotonic()
+        proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=30)
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn("timed out after 0.2s", proc.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
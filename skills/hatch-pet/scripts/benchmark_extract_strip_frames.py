@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark array-based strip extraction against the original per-pixel loops."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from extract_strip_frames import connected_components, parse_hex_color, remove_chroma_background
+
+
+def legacy_remove_chroma_background(
+    image: Image.Image,
+    chroma_key: tuple[int, int, int],
+    threshold: float,
+) -> Image.Image:
+    rgba = image.convert("RGBA")
+    pixels = rgba.load()
+    for y in range(rgba.height):
+        for x in range(rgba.width):
+            red, green, blue, _alpha = pixels[x, y]
+            distance = math.sqrt(
+                (red - chroma_key[0]) ** 2 + (green - chroma_key[1]) ** 2 + (blue - chroma_key[2]) ** 2
+            )
+            if distance <= threshold:
+                pixels[x, y] = (red, green, blue, 0)
+    return rgba
+
+
+def legacy_connected_components(image: Image.Image) -> list[dict[str, object]]:
+    alpha = image.getchannel("A")
+    width, height = image.size
+    data = alpha.tobytes()
+    visited = bytearray(width * height)
+    components: list[dict[str, object]] = []
+    for start, alpha_value in enumerate(data):
+        if alpha_value <= 16 or visited[start]:
+            continue
+        stack = [start]
+        visited[start] = 1
+        pixels: list[int] = []
+        while stack:
+            current = stack.pop()
+            pixels.append(current)
+            x = current % width
+            y = current // width
+            neighbors = []
+            if x > 0:
+                neighbors.append(current - 1)
+            if x + 1 < width:
+                neighbors.append(current + 1)
+            if y > 0:
+                neighbors.append(current - width)
+            if y + 1 < height:
+                neighbors.append(current + width)
+            for neighbor in neighbors:
+                if not visited[neighbor] and data[neighbor] > 16:
+                    visited[neighbor] = 1
+                    stack.append(neighbor)
+        xs = [pixel % width for pixel in pixels]
+        ys = [pixel // width for pixel in pixels]
+        components.append(
+            {
+                "pixels": pixels,
+                "area": len(pixels),
+                "bbox": (min(xs), min(ys), max(xs) + 1, max(ys) + 1),
+                "center_x": (min(xs) + max(xs) + 1) / 2,
+            }
+        )
+    return components
+
+
+def same_components(legacy: list[dict[str, object]], labelled: tuple[np.ndarray, list[dict[str, object]]]) -> bool:
+    labels, components = labelled
+    if len(legacy) != len(components):
+        return False
+    flat_labels = labels.reshape(-1)
+    for old, new in zip(legacy, components):
+        if (old["area"], old["bbox"], old["center_x"]) != (new["area"], new["bbox"], new["center_x"]):
+            return False
+        if not np.all(flat_labels[old["pixels"]] == new["label"]):
+            return False
+    return True
+
+
+def synthetic_strip(
+    width: int,
+    height: int,
+    frame_count: int,
+    chroma_key: tuple[int, int, int],
+    seed: int,
+) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[..., :3] = chroma_key
+    pixels[..., 3] = 255
+    noise = rng.integers(-40, 41, size=(height, width, 3))
+    pixels[..., :3] = np.clip(pixels[..., :3].astype(np.int32) + noise, 0, 255)
+    yy, xx = np.mgrid[0:height, 0:width]
+    slot = width / frame_count
+    for index in range(frame_count):
+        center_x = (index + 0.5) * slot
+        radius = min(slot, height) * 0.35
+        body = (xx - center_x) ** 2 + (yy - height / 2) ** 2 <= radius**2
+        pixels[body, :3] = rng.integers(0, 256, size=(int(body.sum()), 3))
+    return Image.fromarray(pixels, "RGBA")
+
+
+def timed(callback, repeat: int) -> tuple[float, object]:
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = callback()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--strip", help="Benchmark an existing decoded strip instead of a synthetic one.")
+    parser.add_argument("--width", type=int, default=1536)
+    parser.add_argument("--height", type=int, default=256)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--chroma-key", default="#00FF00")
+    parser.add_argument("--key-threshold", type=float, default=96.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    chroma_key = parse_hex_color(args.chroma_key)
+    if args.strip:
+        with Image.open(Path(args.strip).expanduser().resolve()) as opened:
+            strip = opened.convert("RGBA")
+    else:
+        strip = synthetic_strip(args.width, args.height, args.frames, chroma_key, args.seed)
+
+    legacy_seconds, legacy = timed(
+        lambda: legacy_remove_chroma_background(strip, chroma_key, args.key_threshold),
+        args.repeat,
+    )
+    vector_seconds, vector = timed(
+        lambda: remove_chroma_background(strip, chroma_key, args.key_threshold),
+        args.repeat,
+    )
+    same_alpha = legacy.getchannel("A").tobytes() == vector.getchannel("A").tobytes()
+
+    legacy_components_seconds, legacy_components = timed(
+        lambda: legacy_connected_components(vector),
+        args.repeat,
+    )
+    labelled_seconds, labelled = timed(lambda: connected_components(vector), args.repeat)
+    components_match = same_components(legacy_components, labelled)
+
+    result = {
+        "ok": same_alpha and components_match,
+        "size": [strip.width, strip.height],
+        "chroma_key": {"rgb": list(chroma_key), "threshold": args.key_threshold},
+        "chroma_key_removal": {
+            "legacy_seconds": round(legacy_seconds, 4),
+            "vectorized_seconds": round(vector_seconds, 4),
+            "speedup": round(legacy_seconds / vector_seconds, 1) if vector_seconds else None,
+            "same_alpha_mask": same_alpha,
+        },
+        "connected_components": {
+            "components": len(labelled[1]),
+            "legacy_seconds": round(legacy_components_seconds, 4),
+            "labelled_seconds": round(labelled_seconds, 4),
+            "speedup": round(legacy_components_seconds / labelled_seconds, 1) if labelled_seconds else None,
+            "same_components": components_match,
+        },
+    }
+    print(json.dumps(result, indent=2))
+    raise SystemExit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,29 +4,41 @@
 from __future__ import annotations
 
 import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 
-COLUMNS = 8
-ROWS = 9
-CELL_WIDTH = 192
-CELL_HEIGHT = 208
-ATLAS_WIDTH = COLUMNS * CELL_WIDTH
-ATLAS_HEIGHT = ROWS * CELL_HEIGHT
-ATLAS_ASPECT_RATIO = ATLAS_WIDTH / ATLAS_HEIGHT
-ROW_SPECS = [
-    ("idle", 0, 6),
-    ("running-right", 1, 8),
-    ("running-left", 2, 8),
-    ("waving", 3, 4),
-    ("jumping", 4, 5),
-    ("failed", 5, 8),
-    ("waiting", 6, 6),
-    ("running", 7, 6),
-    ("review", 8, 6),
-]
+from pet_atlas import (
+    ATLAS_ASPECT_RATIO,
+    ATLAS_HEIGHT,
+    ATLAS_SIZE,
+    ATLAS_WIDTH,
+    CELL_HEIGHT,
+    CELL_WIDTH,
+    COLUMN_OFFSETS,
+    COLUMNS,
+    ROW_OFFSETS,
+    ROW_SPECS,
+    ROWS,
+    USED_COLUMNS,
+)
+
 IMAGE_SUFFIXES = {".png", ".webp", ".jpg", ".jpeg"}
+# Both profiles stay lossless; draft only trades file size for encode speed.
+ENCODE_PROFILES: dict[str, dict[str, dict[str, object]]] = {
+    "draft": {
+        "png": {"compress_level": 1},
+        "webp": {"lossless": True, "quality": 0, "method": 0},
+    },
+    "release": {
+        "png": {"optimize": True},
+        "webp": {"lossless": True, "quality": 100, "method": 6},
+    },
+}
+DEFAULT_ENCODE_PROFILE = "release"
 
 
 def image_files(path: Path) -> list[Path]:
@@ -61,15 +73,15 @@ def paste_centered(atlas: Image.Image, source: Image.Image, row: int, column: in
     frame = source.convert("RGBA")
     if frame.size != (CELL_WIDTH, CELL_HEIGHT):
         frame.thumbnail((CELL_WIDTH, CELL_HEIGHT), Image.Resampling.LANCZOS)
-    left = column * CELL_WIDTH + (CELL_WIDTH - frame.width) // 2
-    top = row * CELL_HEIGHT + (CELL_HEIGHT - frame.height) // 2
+    left = COLUMN_OFFSETS[column] + (CELL_WIDTH - frame.width) // 2
+    top = ROW_OFFSETS[row] + (CELL_HEIGHT - frame.height) // 2
     atlas.alpha_composite(frame, (left, top))
 
 
 def compose_from_source_atlas(path: Path, resize_source: bool) -> Image.Image:
     with Image.open(path) as opened:
         source = opened.convert("RGBA")
-    if source.size != (ATLAS_WIDTH, ATLAS_HEIGHT):
+    if source.size != ATLAS_SIZE:
         if not resize_source:
             raise SystemExit(
                 f"source atlas must be {ATLAS_WIDTH}x{ATLAS_HEIGHT}; got {source.width}x{source.height}"
@@ -81,20 +93,29 @@ def compose_from_source_atlas(path: Path, resize_source: bool) -> Image.Image:
                 f"the Codex atlas ratio {ATLAS_ASPECT_RATIO:.3f}; got {source_ratio:.3f}. "
                 "Generate exact atlas dimensions or use --frames-root."
             )
-        source = source.resize((ATLAS_WIDTH, ATLAS_HEIGHT), Image.Resampling.LANCZOS)
-
-    atlas = Image.new("RGBA", (ATLAS_WIDTH, ATLAS_HEIGHT), (0, 0, 0, 0))
-    for _state, row, frame_count in ROW_SPECS:
-        for column in range(frame_count):
-            left = column * CELL_WIDTH
-            top = row * CELL_HEIGHT
-            cell = source.crop((left, top, left + CELL_WIDTH, top + CELL_HEIGHT))
-            atlas.alpha_composite(cell, (left, top))
+        source = source.resize(ATLAS_SIZE, Image.Resampling.LANCZOS)
+
+    # Compositing onto a transparent canvas keeps visible pixels as-is and clears
+    # fully transparent ones, so do that directly on the buffer and blank unused cells.
+    pixels = np.array(source)
+    pixels[pixels[..., 3] == 0] = 0
+    pixels.reshape(ROWS, CELL_HEIGHT, COLUMNS, CELL_WIDTH, 4).swapaxes(1, 2)[~USED_COLUMNS] = 0
+    return Image.fromarray(pixels, "RGBA")
+
+
+def compose_from_images(rows: dict[str, list[Image.Image]]) -> Image.Image:
+    atlas = Image.new("RGBA", ATLAS_SIZE, (0, 0, 0, 0))
+    for state, row, frame_count in ROW_SPECS:
+        frames = rows.get(state, [])
+        if len(frames) < frame_count:
+            raise SystemExit(f"{state} row needs {frame_count} frames, found {len(frames)}")
+        for column, frame in enumerate(frames[:frame_count]):
+            paste_centered(atlas, frame, row, column)
     return atlas
 
 
 def compose_from_frames(root: Path) -> Image.Image:
-    atlas = Image.new("RGBA", (ATLAS_WIDTH, ATLAS_HEIGHT), (0, 0, 0, 0))
+    atlas = Image.new("RGBA", ATLAS_SIZE, (0, 0, 0, 0))
     for state, row, frame_count in ROW_SPECS:
         files = find_row_frames(root, state, row)
         if len(files) < frame_count:
@@ -107,12 +128,37 @@ def compose_from_frames(root: Path) -> Image.Image:
     return atlas
 
 
-def save_outputs(atlas: Image.Image, output: Path, webp_output: Path | None) -> None:
-    output.parent.mkdir(parents=True, exist_ok=True)
-    atlas.save(output)
+def encode_output(
+    atlas: Image.Image, path: Path, image_format: str | None, options: dict[str, object]
+) -> dict[str, object]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    atlas.save(path, format=image_format, **options)
+    return {
+        "path": str(path),
+        "format": image_format or Image.registered_extensions()[path.suffix.lower()],
+        "bytes": path.stat().st_size,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def save_outputs(
+    atlas: Image.Image,
+    output: Path,
+    webp_output: Path | None,
+    profile: str = DEFAULT_ENCODE_PROFILE,
+) -> list[dict[str, object]]:
+    settings = ENCODE_PROFILES[profile]
+    tasks = [(atlas, output, None, settings["png"])]
     if webp_output is not None:
-        webp_output.parent.mkdir(parents=True, exist_ok=True)
-        atlas.save(webp_output, format="WEBP", lossless=True, quality=100, method=6)
+        # Image.save stores per-call encoder state on the image, so concurrent
+        # encodes each get their own copy.
+        tasks.append((atlas.copy(), webp_output, "WEBP", settings["webp"]))
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        results = list(executor.map(lambda task: encode_output(*task), tasks))
+    for result in results:
+        result["profile"] = profile
+    return results
 
 
 def main() -> None:
@@ -127,6 +173,12 @@ def main() -> None:
         action="store_true",
         help="Resize a lower-resolution source atlas only when it already has the Codex atlas aspect ratio.",
     )
+    parser.add_argument(
+        "--encode-profile",
+        choices=sorted(ENCODE_PROFILES),
+        default=DEFAULT_ENCODE_PROFILE,
+        help="draft encodes fast for repair loops; release compresses hardest for shipping.",
+    )
     args = parser.parse_args()
 
     if args.source_atlas:
@@ -136,14 +188,14 @@ def main() -> None:
     else:
         atlas = compose_from_frames(Path(args.frames_root).expanduser().resolve())
 
-    save_outputs(
+    outputs = save_outputs(
         atlas,
         Path(args.output).expanduser().resolve(),
         Path(args.webp_output).expanduser().resolve() if args.webp_output else None,
+        args.encode_profile,
     )
-    print(f"wrote {Path(args.output).expanduser().resolve()}")
-    if args.webp_output:
-        print(f"wrote {Path(args.webp_output).expanduser().resolve()}")
+    for result in outputs:
+        print(f"wrote {result['path']} ({result['bytes']} bytes in {result['seconds']:.2f}s)")
 
 
 if __name__ == "__main__":
@@ -4,41 +4,14 @@
 from __future__ import annotations
 
 import argparse
-import hashlib
 import json
 from datetime import datetime, timezone
 from pathlib import Path
 
 from PIL import Image, ImageOps
 
-
-def load_manifest(run_dir: Path) -> dict[str, object]:
-    path = run_dir / "imagegen-jobs.json"
-    if not path.exists():
-        raise SystemExit(f"job manifest not found: {path}")
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def job_list(manifest: dict[str, object]) -> list[dict[str, object]]:
-    jobs = manifest.get("jobs")
-    if not isinstance(jobs, list):
-        raise SystemExit("invalid imagegen-jobs.json: jobs must be a list")
-    return [job for job in jobs if isinstance(job, dict)]
-
-
-def find_job(manifest: dict[str, object], job_id: str) -> dict[str, object]:
-    for job in job_list(manifest):
-        if job.get("id") == job_id:
-            return job
-    raise SystemExit(f"unknown job id: {job_id}")
-
-
-def file_sha256(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as file:
-        for chunk in iter(lambda: file.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
+from hash_cache import HashCache
+from job_manifest import find_job, load_manifest, update_manifest
 
 
 def image_metadata(path: Path) -> dict[str, object]:
@@ -57,6 +30,17 @@ def manifest_relative(path: Path, run_dir: Path) -> str:
     return str(path.resolve().relative_to(run_dir.resolve()))
 
 
+def ensure_mirrorable(manifest: dict[str, object]) -> tuple[dict[str, object], dict[str, object]]:
+    right_job = find_job(manifest, "running-right")
+    left_job = find_job(manifest, "running-left")
+    if right_job.get("status") != "complete":
+        raise SystemExit("running-right must be complete before deriving running-left")
+    mirror_policy = left_job.get("mirror_policy")
+    if not isinstance(mirror_policy, dict) or mirror_policy.get("may_derive_from") != "running-right":
+        raise SystemExit("running-left is not configured for conditional mirroring")
+    return right_job, left_job
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--run-dir", required=True)
@@ -79,16 +63,7 @@ def main() -> None:
         raise SystemExit("--decision-note must explain why mirroring is appropriate")
 
     run_dir = Path(args.run_dir).expanduser().resolve()
-    manifest_path = run_dir / "imagegen-jobs.json"
-    manifest = load_manifest(run_dir)
-    right_job = find_job(manifest, "running-right")
-    left_job = find_job(manifest, "running-left")
-
-    if right_job.get("status") != "complete":
-        raise SystemExit("running-right must be complete before deriving running-left")
-    mirror_policy = left_job.get("mirror_policy")
-    if not isinstance(mirror_policy, dict) or mirror_policy.get("may_derive_from") != "running-right":
-        raise SystemExit("running-left is not configured for conditional mirroring")
+    ensure_mirrorable(load_manifest(run_dir))
 
     source = run_dir / "decoded" / "running-right.png"
     output = run_dir / "decoded" / "running-left.png"
@@ -102,29 +77,38 @@ def main() -> None:
         mirrored = ImageOps.mirror(image.convert("RGBA"))
         mirrored.save(output)
 
-    left_job["status"] = "complete"
-    left_job["source_path"] = manifest_relative(source, run_dir)
-    left_job["source_provenance"] = "deterministic-mirror"
-    left_job["derived_from"] = "running-right"
-    left_job["source_sha256"] = file_sha256(source)
-    left_job["output_sha256"] = file_sha256(output)
-    left_job["completed_at"] = datetime.now(timezone.utc).isoformat()
-    left_job["metadata"] = image_metadata(output)
-    left_job["mirror_decision"] = {
-        "approved": True,
-        "approved_at": left_job["completed_at"],
-        "note": args.decision_note.strip(),
-    }
-    for key in [
-        "last_error",
-        "secondary_fallback",
-        "synthetic_test_source",
-        "repair_reason",
-        "queued_at",
-    ]:
-        left_job.pop(key, None)
-
-    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    hashes = HashCache(run_dir)
+    source_sha256 = hashes.sha256(source)
+    output_sha256 = hashes.sha256(output)
+    metadata = image_metadata(output)
+    source_path = manifest_relative(source, run_dir)
+
+    def record_mirror(manifest: dict[str, object]) -> None:
+        _right_job, left_job = ensure_mirrorable(manifest)
+        left_job["status"] = "complete"
+        left_job["source_path"] = source_path
+        left_job["source_provenance"] = "deterministic-mirror"
+        left_job["derived_from"] = "running-right"
+        left_job["source_sha256"] = source_sha256
+        left_job["output_sha256"] = output_sha256
+        left_job["completed_at"] = datetime.now(timezone.utc).isoformat()
+        left_job["metadata"] = metadata
+        left_job["mirror_decision"] = {
+            "approved": True,
+            "approved_at": left_job["completed_at"],
+            "note": args.decision_note.strip(),
+        }
+        for key in [
+            "last_error",
+            "secondary_fallback",
+            "synthetic_test_source",
+            "repair_reason",
+            "queued_at",
+        ]:
+            left_job.pop(key, None)
+
+    update_manifest(run_dir, record_mirror)
+    hashes.save()
     print(
         json.dumps(
             {
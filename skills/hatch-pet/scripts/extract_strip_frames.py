@@ -6,24 +6,17 @@ from __future__ import annotations
 import argparse
 import json
 import math
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 
-CELL_WIDTH = 192
-CELL_HEIGHT = 208
-ROW_FRAME_COUNTS = {
-    "idle": 6,
-    "running-right": 8,
-    "running-left": 8,
-    "waving": 4,
-    "jumping": 5,
-    "failed": 8,
-    "waiting": 6,
-    "running": 6,
-    "review": 6,
-}
+from pet_atlas import CELL_HEIGHT, CELL_WIDTH, ROW_FRAME_COUNTS
+
+DEFAULT_KEY_THRESHOLD = 96.0
 
 
 def parse_states(raw: str) -> list[str]:
@@ -54,28 +47,48 @@ def load_chroma_key(decoded_dir: Path, override: str | None) -> tuple[int, int,
     return parse_hex_color("#00FF00")
 
 
-def color_distance(
-    red: int,
-    green: int,
-    blue: int,
-    key: tuple[int, int, int],
-) -> float:
-    return math.sqrt((red - key[0]) ** 2 + (green - key[1]) ** 2 + (blue - key[2]) ** 2)
+def squared_distance_limit(threshold: float) -> int:
+    # Integer bound that keys exactly the pixels math.sqrt(distance) <= threshold would.
+    if threshold < 0:
+        return -1
+    limit = math.floor(threshold * threshold)
+    while math.sqrt(limit + 1) <= threshold:
+        limit += 1
+    while limit >= 0 and math.sqrt(limit) > threshold:
+        limit -= 1
+    return limit
+
+
+def chroma_squared_distance(pixels: np.ndarray, chroma_key: tuple[int, int, int]) -> np.ndarray:
+    delta = pixels[..., :3].astype(np.int32) - np.asarray(chroma_key, dtype=np.int32)
+    return np.einsum("...c,...c->...", delta, delta)
 
 
 def remove_chroma_background(
     image: Image.Image,
     chroma_key: tuple[int, int, int],
     threshold: float,
+    soft_band: float = 0.0,
 ) -> Image.Image:
-    rgba = image.convert("RGBA")
-    pixels = rgba.load()
-    for y in range(rgba.height):
-        for x in range(rgba.width):
-            red, green, blue, alpha = pixels[x, y]
-            if color_distance(red, green, blue, chroma_key) <= threshold:
-                pixels[x, y] = (red, green, blue, 0)
-    return rgba
+    pixels = np.array(image.convert("RGBA"), dtype=np.uint8)
+    distance_sq = chroma_squared_distance(pixels, chroma_key)
+    keyed = distance_sq <= squared_distance_limit(threshold)
+    pixels[..., 3][keyed] = 0
+
+    if soft_band > 0:
+        outer_limit = squared_distance_limit(threshold + soft_band)
+        band = ~keyed & (distance_sq <= outer_limit) & (pixels[..., 3] > 0)
+        if band.any():
+            # Treat edge pixels as a blend of sprite and key, then unmix the key colour.
+            coverage = (np.sqrt(distance_sq[band]) - threshold) / soft_band
+            coverage = np.clip(coverage, 1.0 / 255.0, 1.0)[:, None]
+            key = np.asarray(chroma_key, dtype=np.float64)
+            rgb = pixels[..., :3][band].astype(np.float64)
+            unmixed = (rgb - (1.0 - coverage) * key) / coverage
+            pixels[..., :3][band] = np.clip(np.rint(unmixed), 0, 255).astype(np.uint8)
+            alpha = pixels[..., 3][band].astype(np.float64) * coverage[:, 0]
+            pixels[..., 3][band] = np.rint(alpha).astype(np.uint8)
+    return Image.fromarray(pixels, "RGBA")
 
 
 def fit_to_cell(image: Image.Image) -> Image.Image:
@@ -99,92 +112,120 @@ def fit_to_cell(image: Image.Image) -> Image.Image:
     return target
 
 
-def connected_components(image: Image.Image) -> list[dict[str, object]]:
-    alpha = image.getchannel("A")
-    width, height = image.size
-    data = alpha.tobytes()
-    visited = bytearray(width * height)
-    components: list[dict[str, object]] = []
-
-    for start, alpha_value in enumerate(data):
-        if alpha_value <= 16 or visited[start]:
-            continue
-
-        stack = [start]
-        visited[start] = 1
-        pixels: list[int] = []
-        min_x = width
-        min_y = height
-        max_x = 0
-        max_y = 0
-
-        while stack:
-            current = stack.pop()
-            pixels.append(current)
-            x = current % width
-            y = current // width
-            min_x = min(min_x, x)
-            min_y = min(min_y, y)
-            max_x = max(max_x, x)
-            max_y = max(max_y, y)
-
-            if x > 0:
-                neighbor = current - 1
-                if not visited[neighbor] and data[neighbor] > 16:
-                    visited[neighbor] = 1
-                    stack.append(neighbor)
-            if x + 1 < width:
-                neighbor = current + 1
-                if not visited[neighbor] and data[neighbor] > 16:
-                    visited[neighbor] = 1
-                    stack.append(neighbor)
-            if y > 0:
-                neighbor = current - width
-                if not visited[neighbor] and data[neighbor] > 16:
-                    visited[neighbor] = 1
-                    stack.append(neighbor)
-            if y + 1 < height:
-                neighbor = current + width
-                if not visited[neighbor] and data[neighbor] > 16:
-                    visited[neighbor] = 1
-                    stack.append(neighbor)
+def alpha_runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def union_find_roots(count: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    parent = list(range(count))
+
+    def find(node: int) -> int:
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        root_a = find(a)
+        root_b = find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.fromiter((find(node) for node in range(count)), dtype=np.int64, count=count)
+
+
+def label_components(mask: np.ndarray) -> tuple[np.ndarray, list[dict[str, object]]]:
+    height, width = mask.shape
+    labels = np.zeros((height, width), dtype=np.int32)
+    rows, starts, ends = alpha_runs(mask)
+    if rows.size == 0:
+        return labels, []
+
+    # Pair every run with the runs it touches in the row above (4-connectivity).
+    stride = width + 1
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    above_keys = (rows - 1) * stride
+    first = np.searchsorted(end_keys, above_keys + starts, side="right")
+    last = np.searchsorted(start_keys, above_keys + ends, side="left")
+    overlaps = np.maximum(last - first, 0)
+    current = np.repeat(np.arange(rows.size), overlaps)
+    offsets = np.arange(current.size) - np.repeat(np.cumsum(overlaps) - overlaps, overlaps)
+    above = np.repeat(first, overlaps) + offsets
+    roots = union_find_roots(rows.size, above, current)
+
+    # Roots are the first run of each component, so raster order matches a pixel scan.
+    unique_roots, run_labels = np.unique(roots, return_inverse=True)
+    run_labels = run_labels.astype(np.int64) + 1
+    count = unique_roots.size
+
+    flat = np.zeros(height * width + 1, dtype=np.int32)
+    np.add.at(flat, rows * width + starts, run_labels)
+    np.add.at(flat, rows * width + ends, -run_labels)
+    np.cumsum(flat[:-1], out=labels.reshape(-1))
+
+    lengths = ends - starts
+    areas = np.bincount(run_labels, weights=lengths, minlength=count + 1)[1:]
+    sum_x = np.bincount(run_labels, weights=(starts + ends - 1) * lengths / 2, minlength=count + 1)[1:]
+    sum_y = np.bincount(run_labels, weights=rows * lengths, minlength=count + 1)[1:]
+    min_x = np.full(count + 1, width)
+    min_y = np.full(count + 1, height)
+    max_x = np.zeros(count + 1, dtype=np.int64)
+    max_y = np.zeros(count + 1, dtype=np.int64)
+    np.minimum.at(min_x, run_labels, starts)
+    np.minimum.at(min_y, run_labels, rows)
+    np.maximum.at(max_x, run_labels, ends)
+    np.maximum.at(max_y, run_labels, rows + 1)
 
+    components: list[dict[str, object]] = []
+    for index in range(count):
+        label = index + 1
+        area = int(areas[index])
         components.append(
             {
-                "pixels": pixels,
-                "area": len(pixels),
-                "bbox": (min_x, min_y, max_x + 1, max_y + 1),
-                "center_x": (min_x + max_x + 1) / 2,
+                "label": label,
+                "area": area,
+                "bbox": (int(min_x[label]), int(min_y[label]), int(max_x[label]), int(max_y[label])),
+                "center_x": (int(min_x[label]) + int(max_x[label])) / 2,
+                "centroid": (float(sum_x[index] / area), float(sum_y[index] / area)),
             }
         )
+    return labels, components
 
-    return components
+
+def connected_components(image: Image.Image) -> tuple[np.ndarray, list[dict[str, object]]]:
+    alpha = np.asarray(image.getchannel("A"))
+    return label_components(alpha > 16)
 
 
 def component_group_image(
-    source: Image.Image,
+    pixels: np.ndarray,
+    labels: np.ndarray,
     components: list[dict[str, object]],
     padding: int = 4,
 ) -> Image.Image:
-    width, height = source.size
+    height, width = labels.shape
     min_x = max(0, min(component["bbox"][0] for component in components) - padding)
     min_y = max(0, min(component["bbox"][1] for component in components) - padding)
     max_x = min(width, max(component["bbox"][2] for component in components) + padding)
     max_y = min(height, max(component["bbox"][3] for component in components) + padding)
 
-    output = Image.new("RGBA", (max_x - min_x, max_y - min_y), (0, 0, 0, 0))
-    source_pixels = source.load()
-    output_pixels = output.load()
-    for component in components:
-        for pixel_index in component["pixels"]:
-            x = pixel_index % width
-            y = pixel_index // width
-            output_pixels[x - min_x, y - min_y] = source_pixels[x, y]
-    return output
+    region = labels[min_y:max_y, min_x:max_x]
+    mask = np.isin(region, [component["label"] for component in components])
+    output = np.zeros((max_y - min_y, max_x - min_x, 4), dtype=np.uint8)
+    output[mask] = pixels[min_y:max_y, min_x:max_x][mask]
+    return Image.fromarray(output, "RGBA")
 
 
 def extract_component_frames(strip: Image.Image, frame_count: int) -> list[Image.Image] | None:
-    components = connected_components(strip)
+    labels, components = connected_components(strip)
     if not components:
         return None
 
@@ -215,7 +256,8 @@ def extract_component_frames(strip: Image.Image, frame_count: int) -> list[Image
         )
         groups[nearest_index].append(component)
 
-    return [fit_to_cell(component_group_image(strip, group)) for group in groups]
+    pixels = np.asarray(strip.convert("RGBA"))
+    return [fit_to_cell(component_group_image(pixels, labels, group)) for group in groups]
 
 
 def extract_slot_frames(strip: Image.Image, frame_count: int) -> list[Image.Image]:
@@ -236,10 +278,11 @@ def extract_state(
     chroma_key: tuple[int, int, int],
     threshold: float,
     method: str,
-) -> dict[str, object]:
+    soft_band: float = 0.0,
+) -> tuple[dict[str, object], list[Image.Image]]:
     frame_count = ROW_FRAME_COUNTS[state]
     with Image.open(strip_path) as opened:
-        strip = remove_chroma_background(opened, chroma_key, threshold)
+        strip = remove_chroma_background(opened, chroma_key, threshold, soft_band)
 
     state_dir = output_root / state
     state_dir.mkdir(parents=True, exist_ok=True)
@@ -262,7 +305,66 @@ def extract_state(
         output = state_dir / f"{index:02d}.png"
         frame.save(output)
         outputs.append(str(output))
-    return {"state": state, "frames": outputs, "method": used_method}
+    return {"state": state, "frames": outputs, "method": used_method}, frames
+
+
+def worker_count(jobs: int, tasks: int) -> int:
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, tasks))
+
+
+def extract_states(
+    decoded_dir: Path,
+    states: list[str],
+    output_root: Path,
+    chroma_key: tuple[int, int, int],
+    threshold: float,
+    method: str,
+    soft_band: float = 0.0,
+    jobs: int = 1,
+) -> list[tuple[dict[str, object], list[Image.Image]]]:
+    tasks = []
+    for state in states:
+        strip_path = decoded_dir / f"{state}.png"
+        if not strip_path.is_file():
+            raise SystemExit(f"missing generated strip for {state}: {strip_path}")
+        tasks.append((strip_path, state, output_root, chroma_key, threshold, method, soft_band))
+
+    workers = worker_count(jobs, len(tasks))
+    if workers == 1:
+        return [extract_state(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_state, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def write_frames_manifest(
+    output_root: Path,
+    chroma_key: tuple[int, int, int],
+    threshold: float,
+    soft_band: float,
+    rows: list[dict[str, object]],
+) -> Path:
+    path = output_root / "frames-manifest.json"
+    path.write_text(
+        json.dumps(
+            {
+                "ok": True,
+                "chroma_key": {
+                    "hex": f"#{chroma_key[0]:02X}{chroma_key[1]:02X}{chroma_key[2]:02X}",
+                    "rgb": list(chroma_key),
+                    "threshold": threshold,
+                    "soft_band": soft_band,
+                },
+                "rows": rows,
+            },
+            indent=2,
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    return path
 
 
 def main() -> None:
@@ -271,50 +373,48 @@ def main() -> None:
     parser.add_argument("--output-dir", required=True)
     parser.add_argument("--states", default="all")
     parser.add_argument("--chroma-key", help="Override chroma key as #RRGGBB.")
-    parser.add_argument("--key-threshold", type=float, default=96.0)
+    parser.add_argument("--key-threshold", type=float, default=DEFAULT_KEY_THRESHOLD)
+    parser.add_argument(
+        "--key-soft-band",
+        type=float,
+        default=0.0,
+        help="Feather alpha and unmix the key colour for pixels this far beyond the threshold.",
+    )
     parser.add_argument(
         "--method",
         choices=("auto", "components", "slots"),
         default="auto",
         help="Use connected sprite components when possible, or fixed equal slots.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Extract states in this many worker processes; 0 uses one per CPU.",
+    )
     args = parser.parse_args()
 
     decoded_dir = Path(args.decoded_dir).expanduser().resolve()
     output_dir = Path(args.output_dir).expanduser().resolve()
     chroma_key = load_chroma_key(decoded_dir, args.chroma_key)
     states = parse_states(args.states)
-    manifest = []
-    for state in states:
-        strip_path = decoded_dir / f"{state}.png"
-        if not strip_path.is_file():
-            raise SystemExit(f"missing generated strip for {state}: {strip_path}")
-        manifest.append(
-            extract_state(
-                strip_path,
-                state,
-                output_dir,
-                chroma_key,
-                args.key_threshold,
-                args.method,
-            )
-        )
+    results = extract_states(
+        decoded_dir,
+        states,
+        output_dir,
+        chroma_key,
+        args.key_threshold,
+        args.method,
+        args.key_soft_band,
+        args.jobs,
+    )
 
-    (output_dir / "frames-manifest.json").write_text(
-        json.dumps(
-            {
-                "ok": True,
-                "chroma_key": {
-                    "hex": f"#{chroma_key[0]:02X}{chroma_key[1]:02X}{chroma_key[2]:02X}",
-                    "rgb": list(chroma_key),
-                    "threshold": args.key_threshold,
-                },
-                "rows": manifest,
-            },
-            indent=2,
-        )
-        + "\n",
-        encoding="utf-8",
+    write_frames_manifest(
+        output_dir,
+        chroma_key,
+        args.key_threshold,
+        args.key_soft_band,
+        [row for row, _frames in results],
     )
     print(json.dumps({"ok": True, "frames_root": str(output_dir), "states": states}, indent=2))
 
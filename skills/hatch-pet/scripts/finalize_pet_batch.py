@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Finalize many Codex pet runs at once and write one aggregated summary."""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from compose_atlas import DEFAULT_ENCODE_PROFILE, ENCODE_PROFILES
+from finalize_pet_run import finalize_run
+
+HEAVY_STAGES = ("extract", "inspect", "compose", "videos")
+STAGE_NAMES = (
+    "check-jobs",
+    "extract",
+    "inspect",
+    "compose",
+    "validate",
+    "contact-sheet",
+    "videos",
+    "package",
+)
+
+_STAGE_GATES: dict[str, object] = {}
+
+
+def expand_run_dirs(patterns: list[str], runs_file: str) -> list[Path]:
+    if runs_file:
+        lines = Path(runs_file).expanduser().read_text(encoding="utf-8").splitlines()
+        patterns = patterns + [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+    run_dirs: dict[Path, None] = {}
+    for pattern in patterns:
+        expanded = os.path.expanduser(pattern)
+        matches = sorted(glob.glob(expanded)) if glob.has_magic(expanded) else [expanded]
+        for match in matches:
+            path = Path(match).resolve()
+            if (path / "pet_request.json").is_file():
+                run_dirs[path] = None
+            elif not glob.has_magic(expanded):
+                raise SystemExit(f"not a pet run directory (missing pet_request.json): {path}")
+    if not run_dirs:
+        raise SystemExit("no pet run directories matched")
+    return list(run_dirs)
+
+
+def parse_stage_limits(raw: list[str], default_limit: int) -> dict[str, int]:
+    limits = {stage: default_limit for stage in HEAVY_STAGES}
+    for item in raw:
+        stage, separator, value = item.partition("=")
+        if not separator or stage not in STAGE_NAMES or not value.isdigit():
+            raise SystemExit(
+                f"invalid --stage-limit {item!r}; expected STAGE=N with STAGE in {', '.join(STAGE_NAMES)}"
+            )
+        limits[stage] = int(value)
+    return {stage: limit for stage, limit in limits.items() if limit > 0}
+
+
+def init_worker(stage_gates: dict[str, object]) -> None:
+    _STAGE_GATES.update(stage_gates)
+
+
+def finalize_one(run_dir: Path, options: dict[str, object]) -> dict[str, object]:
+    log_path = run_dir / "qa" / "finalize.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    result: dict[str, object] = {"run_dir": str(run_dir), "log": str(log_path)}
+    with log_path.open("w", encoding="utf-8") as log, redirect_stdout(log):
+        try:
+            summary = finalize_run(run_dir, stage_gates=_STAGE_GATES, **options)
+        except SystemExit as exc:
+            result.update(status="failed", error=str(exc.code))
+        except Exception as exc:  # noqa: BLE001
+            result.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+        else:
+            if summary.get("ok"):
+                result.update(
+                    status="ok",
+                    spritesheet=summary.get("spritesheet"),
+                    encoded_outputs=summary.get("encoded_outputs"),
+                    package=summary.get("package"),
+                )
+            else:
+                result.update(
+                    status="repair-needed",
+                    review=summary.get("review"),
+                    failures=summary.get("failures", []),
+                )
+            result["timings"] = summary.get("timings", {})
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def aggregate(results: list[dict[str, object]], wall_seconds: float) -> dict[str, object]:
+    counts = {"ok": 0, "repair-needed": 0, "failed": 0}
+    stage_totals: dict[str, float] = {}
+    for result in results:
+        counts[str(result["status"])] += 1
+        timings = result.get("timings")
+        if isinstance(timings, dict):
+            for stage, seconds in timings.items():
+                stage_totals[stage] = round(stage_totals.get(stage, 0.0) + float(seconds), 3)
+    return {
+        "ok": counts["ok"] == len(results),
+        "counts": counts,
+        "wall_seconds": round(wall_seconds, 3),
+        "stage_totals": stage_totals,
+        "pets": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("runs", nargs="*", help="Run directories or glob patterns.")
+    parser.add_argument("--runs-file", default="", help="File with one run directory or glob per line.")
+    parser.add_argument("--summary-out", default="", help="Write the aggregated summary JSON here.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Pets finalized concurrently in separate processes; 0 uses one per CPU.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Workers each pet uses inside extraction, QA and video rendering.",
+    )
+    parser.add_argument(
+        "--stage-limit",
+        action="append",
+        default=[],
+        metavar="STAGE=N",
+        help=(
+            "Cap how many pets may run STAGE at the same time. CPU-heavy stages "
+            f"({', '.join(HEAVY_STAGES)}) default to CPUs // --jobs; 0 removes a cap."
+        ),
+    )
+    parser.add_argument("--allow-slot-extraction", action="store_true")
+    parser.add_argument("--skip-videos", action="store_true")
+    parser.add_argument("--skip-package", action="store_true")
+    parser.add_argument("--ffmpeg", default="")
+    parser.add_argument("--verify-hashes", action="store_true")
+    parser.add_argument("--encode-profile", choices=sorted(ENCODE_PROFILES), default=DEFAULT_ENCODE_PROFILE)
+    parser.add_argument("--allow-synthetic-test-sources", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    run_dirs = expand_run_dirs(args.runs, args.runs_file)
+    cpus = os.cpu_count() or 1
+    jobs = max(1, args.jobs)
+    workers = max(1, min(args.workers if args.workers > 0 else cpus, len(run_dirs)))
+    limits = parse_stage_limits(args.stage_limit, max(1, cpus // jobs))
+    stage_gates = {stage: multiprocessing.BoundedSemaphore(limit) for stage, limit in limits.items()}
+    options = {
+        "allow_slot_extraction": args.allow_slot_extraction,
+        "skip_videos": args.skip_videos,
+        "skip_package": args.skip_package,
+        "ffmpeg": args.ffmpeg,
+        "jobs": jobs,
+        "verify_hashes": args.verify_hashes,
+        "encode_profile": args.encode_profile,
+        "allow_synthetic_test_sources": args.allow_synthetic_test_sources,
+    }
+
+    started = time.perf_counter()
+    results: dict[Path, dict[str, object]] = {}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(stage_gates,)
+    ) as executor:
+        futures = {executor.submit(finalize_one, run_dir, options): run_dir for run_dir in run_dirs}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(f"{result['status']}: {result['run_dir']} ({result['seconds']:.2f}s)", flush=True)
+
+    summary = aggregate([results[run_dir] for run_dir in run_dirs], time.perf_counter() - started)
+    summary["workers"] = workers
+    summary["stage_limits"] = limits
+    if args.summary_out:
+        summary_path = Path(args.summary_out).expanduser().resolve()
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        summary_path.write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+    print(json.dumps({key: value for key, value in summary.items() if key != "pets"}, indent=2))
+    raise SystemExit(0 if summary["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,33 +4,58 @@
 from __future__ import annotations
 
 import argparse
-import hashlib
 import json
 import os
-import subprocess
-import sys
+import shutil
+import time
+from collections.abc import Iterator, Mapping
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from pathlib import Path
 
 from PIL import Image, ImageOps
 
-
-def run(command: list[str], *, check: bool = True) -> subprocess.CompletedProcess[str]:
-    print("+ " + " ".join(command))
-    return subprocess.run(command, check=check, text=True)
+from compose_atlas import (
+    DEFAULT_ENCODE_PROFILE,
+    ENCODE_PROFILES,
+    compose_from_images,
+    save_outputs,
+)
+from extract_strip_frames import (
+    DEFAULT_KEY_THRESHOLD,
+    extract_states,
+    load_chroma_key,
+    write_frames_manifest,
+)
+from hash_cache import HashCache
+from inspect_frames import review_frames, write_review
+from make_contact_sheet import build_contact_sheet
+from package_custom_pet import package_pet
+from pet_atlas import ROW_FRAME_COUNTS, Atlas
+from render_animation_videos import render_videos
+from validate_atlas import validate_atlas_image, write_result
+
+
+@contextmanager
+def timed_stage(
+    name: str,
+    timings: dict[str, float],
+    gate: AbstractContextManager[object] | None = None,
+) -> Iterator[None]:
+    with gate or nullcontext():
+        print(f"+ {name}", flush=True)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            timings[name] = round(elapsed, 3)
+            print(f"  {name}: {elapsed:.2f}s", flush=True)
 
 
 def load_json(path: Path) -> dict[str, object]:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
-def file_sha256(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as file:
-        for chunk in iter(lambda: file.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
-
-
 def is_relative_to(path: Path, root: Path) -> bool:
     try:
         path.relative_to(root)
@@ -56,7 +81,9 @@ def manifest_path(raw: object, *, run_dir: Path, field: str, job_id: str) -> Pat
     return path.resolve()
 
 
-def validate_hash(job: dict[str, object], *, source: Path, output: Path, job_id: str) -> None:
+def validate_hash(
+    job: dict[str, object], *, source: Path, output: Path, job_id: str, hashes: HashCache
+) -> None:
     expected_hash = job.get("source_sha256")
     if not isinstance(expected_hash, str) or not expected_hash:
         raise SystemExit(
@@ -67,8 +94,8 @@ def validate_hash(job: dict[str, object], *, source: Path, output: Path, job_id:
         raise SystemExit(f"job {job_id} source image no longer exists: {source}")
     if not output.is_file():
         raise SystemExit(f"job {job_id} decoded output is missing: {output}")
-    source_hash = file_sha256(source)
-    output_hash = file_sha256(output)
+    source_hash = hashes.sha256(source)
+    output_hash = hashes.sha256(output)
     if source_hash != expected_hash:
         raise SystemExit(f"job {job_id} source image hash does not match imagegen-jobs.json")
     if output_hash != expected_hash:
@@ -78,7 +105,9 @@ def validate_hash(job: dict[str, object], *, source: Path, output: Path, job_id:
         )
 
 
-def validate_mirror_hash(job: dict[str, object], *, source: Path, output: Path, job_id: str) -> None:
+def validate_mirror_hash(
+    job: dict[str, object], *, source: Path, output: Path, job_id: str, hashes: HashCache
+) -> None:
     if job_id != "running-left":
         raise SystemExit(f"job {job_id} may not use deterministic mirror provenance")
     if job.get("derived_from") != "running-right":
@@ -104,9 +133,9 @@ def validate_mirror_hash(job: dict[str, object], *, source: Path, output: Path,
         raise SystemExit("running-left mirror source must be decoded/running-right.png")
     if output.name != "running-left.png" or output.parent.name != "decoded":
         raise SystemExit("running-left mirror output must be decoded/running-left.png")
-    if file_sha256(source) != expected_source_hash:
+    if hashes.sha256(source) != expected_source_hash:
         raise SystemExit("running-left mirror source hash does not match imagegen-jobs.json")
-    if file_sha256(output) != expected_output_hash:
+    if hashes.sha256(output) != expected_output_hash:
         raise SystemExit(
             "running-left mirrored output hash does not match imagegen-jobs.json; "
             "rerun derive_running_left_from_running_right.py"
@@ -125,6 +154,7 @@ def validate_completed_job_source(
     *,
     run_dir: Path,
     allow_synthetic_test_sources: bool,
+    hashes: HashCache,
 ) -> None:
     job_id = str(job.get("id") or "")
     source = manifest_path(job.get("source_path"), run_dir=run_dir, field="source_path", job_id=job_id)
@@ -146,17 +176,17 @@ def validate_completed_job_source(
             raise SystemExit(
                 f"job {job_id} uses a synthetic test source; rerun with real $imagegen output"
             )
-        validate_hash(job, source=source, output=output, job_id=job_id)
+        validate_hash(job, source=source, output=output, job_id=job_id, hashes=hashes)
         return
 
     if job.get("secondary_fallback"):
         if job.get("source_provenance") != "secondary-fallback-image-api":
             raise SystemExit(f"job {job_id} has invalid secondary fallback provenance")
-        validate_hash(job, source=source, output=output, job_id=job_id)
+        validate_hash(job, source=source, output=output, job_id=job_id, hashes=hashes)
         return
 
     if job.get("source_provenance") == "deterministic-mirror":
-        validate_mirror_hash(job, source=source, output=output, job_id=job_id)
+        validate_mirror_hash(job, source=source, output=output, job_id=job_id, hashes=hashes)
         return
 
     if job.get("source_provenance") != "built-in-imagegen":
@@ -175,10 +205,12 @@ def validate_completed_job_source(
             f"job {job_id} source image is not a built-in $imagegen output under "
             f"{generated_root}/.../ig_*.png"
         )
-    validate_hash(job, source=source, output=output, job_id=job_id)
+    validate_hash(job, source=source, output=output, job_id=job_id, hashes=hashes)
 
 
-def require_complete_jobs(run_dir: Path, *, allow_synthetic_test_sources: bool) -> None:
+def require_complete_jobs(
+    run_dir: Path, *, allow_synthetic_test_sources: bool, hashes: HashCache
+) -> None:
     manifest_path = run_dir / "imagegen-jobs.json"
     manifest = load_json(manifest_path)
     jobs = manifest.get("jobs")
@@ -194,13 +226,17 @@ def require_complete_jobs(run_dir: Path, *, allow_synthetic_test_sources: bool)
             "imagegen jobs are not complete; run pet_job_status.py and finish: "
             + ", ".join(incomplete)
         )
-    for job in jobs:
-        if isinstance(job, dict):
-            validate_completed_job_source(
-                job,
-                run_dir=run_dir,
-                allow_synthetic_test_sources=allow_synthetic_test_sources,
-            )
+    try:
+        for job in jobs:
+            if isinstance(job, dict):
+                validate_completed_job_source(
+                    job,
+                    run_dir=run_dir,
+                    allow_synthetic_test_sources=allow_synthetic_test_sources,
+                    hashes=hashes,
+                )
+    finally:
+        hashes.save()
 
 
 def review_failures(review: dict[str, object]) -> list[str]:
@@ -217,23 +253,20 @@ def review_failures(review: dict[str, object]) -> list[str]:
     return failures
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--run-dir", required=True)
-    parser.add_argument("--allow-slot-extraction", action="store_true")
-    parser.add_argument("--skip-videos", action="store_true")
-    parser.add_argument("--skip-package", action="store_true")
-    parser.add_argument(
-        "--package-dir",
-        default="",
-        help="Exact pet package directory. Defaults to ${CODEX_HOME:-$HOME/.codex}/pets/<pet-name>.",
-    )
-    parser.add_argument("--ffmpeg", default="")
-    parser.add_argument("--allow-synthetic-test-sources", action="store_true", help=argparse.SUPPRESS)
-    args = parser.parse_args()
-
-    scripts_dir = Path(__file__).resolve().parent
-    run_dir = Path(args.run_dir).expanduser().resolve()
+def finalize_run(
+    run_dir: Path,
+    *,
+    allow_slot_extraction: bool = False,
+    skip_videos: bool = False,
+    skip_package: bool = False,
+    package_dir: Path | None = None,
+    ffmpeg: str = "",
+    jobs: int = 0,
+    verify_hashes: bool = False,
+    encode_profile: str = DEFAULT_ENCODE_PROFILE,
+    allow_synthetic_test_sources: bool = False,
+    stage_gates: Mapping[str, AbstractContextManager[object]] | None = None,
+) -> dict[str, object]:
     request = load_json(run_dir / "pet_request.json")
     pet_id = str(request.get("pet_id") or "")
     display_name = str(request.get("display_name") or "")
@@ -241,141 +274,177 @@ def main() -> None:
     if not pet_id or not display_name or not description:
         raise SystemExit("pet_request.json is missing pet_id, display_name, or description")
 
-    require_complete_jobs(
-        run_dir,
-        allow_synthetic_test_sources=args.allow_synthetic_test_sources,
-    )
+    gates = stage_gates or {}
+    timings: dict[str, float] = {}
+    hashes = HashCache(run_dir, verify=verify_hashes)
+    with timed_stage("check-jobs", timings, gates.get("check-jobs")):
+        require_complete_jobs(
+            run_dir,
+            allow_synthetic_test_sources=allow_synthetic_test_sources,
+            hashes=hashes,
+        )
 
+    decoded_dir = run_dir / "decoded"
+    frames_root = run_dir / "frames"
     final_dir = run_dir / "final"
     qa_dir = run_dir / "qa"
     final_dir.mkdir(parents=True, exist_ok=True)
     qa_dir.mkdir(parents=True, exist_ok=True)
+    spritesheet_png = final_dir / "spritesheet.png"
+    spritesheet_webp = final_dir / "spritesheet.webp"
+    validation_path = final_dir / "validation.json"
+    contact_sheet_path = qa_dir / "contact-sheet.png"
+    review_path = qa_dir / "review.json"
 
-    run(
-        [
-            sys.executable,
-            str(scripts_dir / "extract_strip_frames.py"),
-            "--decoded-dir",
-            str(run_dir / "decoded"),
-            "--output-dir",
-            str(run_dir / "frames"),
-            "--states",
-            "all",
-            "--method",
+    with timed_stage("extract", timings, gates.get("extract")):
+        chroma_key = load_chroma_key(decoded_dir, None)
+        results = extract_states(
+            decoded_dir,
+            list(ROW_FRAME_COUNTS),
+            frames_root,
+            chroma_key,
+            DEFAULT_KEY_THRESHOLD,
             "auto",
-        ]
-    )
+            jobs=jobs,
+        )
+        write_frames_manifest(
+            frames_root,
+            chroma_key,
+            DEFAULT_KEY_THRESHOLD,
+            0.0,
+            [row for row, _frames in results],
+        )
+    row_frames = {
+        str(row["state"]): list(zip((Path(path) for path in row["frames"]), frames, strict=True))
+        for row, frames in results
+    }
 
-    review_path = qa_dir / "review.json"
-    inspect_command = [
-        sys.executable,
-        str(scripts_dir / "inspect_frames.py"),
-        "--frames-root",
-        str(run_dir / "frames"),
-        "--json-out",
-        str(review_path),
-    ]
-    if not args.allow_slot_extraction:
-        inspect_command.append("--require-components")
-    run(inspect_command, check=False)
-    review = load_json(review_path)
+    with timed_stage("inspect", timings, gates.get("inspect")):
+        review = review_frames(
+            frames_root,
+            row_frames,
+            jobs=jobs,
+            require_components=not allow_slot_extraction,
+        )
+        write_review(review, review_path)
     if not review.get("ok"):
-        failures = review_failures(review)
-        print(
-            json.dumps(
-                {
-                    "ok": False,
-                    "review": str(review_path),
-                    "repair_hint": "Run queue_pet_repairs.py, regenerate the reopened row jobs with $imagegen, then finalize again.",
-                    "failures": failures,
-                },
-                indent=2,
-            )
+        return {
+            "ok": False,
+            "review": str(review_path),
+            "repair_hint": "Run queue_pet_repairs.py, regenerate the reopened row jobs with $imagegen, then finalize again.",
+            "failures": review_failures(review),
+            "timings": timings,
+        }
+
+    with timed_stage("compose", timings, gates.get("compose")):
+        atlas = compose_from_images(
+            {state: [frame for _path, frame in frames] for state, frames in row_frames.items()}
         )
-        raise SystemExit(1)
-
-    run(
-        [
-            sys.executable,
-            str(scripts_dir / "compose_atlas.py"),
-            "--frames-root",
-            str(run_dir / "frames"),
-            "--output",
-            str(final_dir / "spritesheet.png"),
-            "--webp-output",
-            str(final_dir / "spritesheet.webp"),
-        ]
-    )
-    run(
-        [
-            sys.executable,
-            str(scripts_dir / "validate_atlas.py"),
-            str(final_dir / "spritesheet.webp"),
-            "--json-out",
-            str(final_dir / "validation.json"),
-        ]
-    )
-    run(
-        [
-            sys.executable,
-            str(scripts_dir / "make_contact_sheet.py"),
-            str(final_dir / "spritesheet.webp"),
-            "--output",
-            str(qa_dir / "contact-sheet.png"),
-        ]
-    )
-
-    if not args.skip_videos:
-        video_command = [
-            sys.executable,
-            str(scripts_dir / "render_animation_videos.py"),
-            str(final_dir / "spritesheet.webp"),
-            "--output-dir",
-            str(qa_dir / "videos"),
-        ]
-        if args.ffmpeg:
-            video_command.extend(["--ffmpeg", args.ffmpeg])
-        run(video_command)
-
-    if not args.skip_package:
-        package_command = [
-            sys.executable,
-            str(scripts_dir / "package_custom_pet.py"),
-            "--pet-name",
-            pet_id,
-            "--display-name",
-            display_name,
-            "--description",
-            description,
-            "--spritesheet",
-            str(final_dir / "spritesheet.webp"),
-            "--force",
-        ]
-        if args.package_dir:
-            package_command.extend(["--output-dir", str(Path(args.package_dir).expanduser().resolve())])
-        run(package_command)
-
-    package_dir = None
-    if not args.skip_package:
-        package_dir = (
-            Path(args.package_dir).expanduser().resolve()
-            if args.package_dir
-            else default_codex_home() / "pets" / pet_id
+        encoded = save_outputs(atlas, spritesheet_png, spritesheet_webp, encode_profile)
+        decoded_atlas = Atlas.from_image(atlas)
+
+    with timed_stage("validate", timings, gates.get("validate")):
+        validation = validate_atlas_image(
+            atlas,
+            source_format=encoded[-1]["format"],
+            source_mode=atlas.mode,
+            file=str(spritesheet_webp),
         )
+        write_result(validation, validation_path)
+    if not validation["ok"]:
+        raise SystemExit(
+            f"atlas validation failed ({validation_path}): " + "; ".join(validation["errors"])
+        )
+
+    with timed_stage("contact-sheet", timings, gates.get("contact-sheet")):
+        build_contact_sheet(decoded_atlas).save(contact_sheet_path)
+
+    if not skip_videos:
+        with timed_stage("videos", timings, gates.get("videos")):
+            render_videos(
+                decoded_atlas,
+                qa_dir / "videos",
+                ffmpeg=ffmpeg or shutil.which("ffmpeg") or "ffmpeg",
+                jobs=jobs,
+            )
+
+    package = None
+    if not skip_package:
+        with timed_stage("package", timings, gates.get("package")):
+            package = package_pet(
+                pet_name=pet_id,
+                display_name=display_name,
+                description=description,
+                spritesheet=spritesheet_webp,
+                codex_home=default_codex_home(),
+                output_dir=package_dir,
+                force=True,
+            )
 
     summary = {
         "ok": True,
         "run_dir": str(run_dir),
-        "spritesheet": str(final_dir / "spritesheet.webp"),
-        "validation": str(final_dir / "validation.json"),
-        "contact_sheet": str(qa_dir / "contact-sheet.png"),
+        "spritesheet": str(spritesheet_webp),
+        "validation": str(validation_path),
+        "contact_sheet": str(contact_sheet_path),
         "review": str(review_path),
-        "videos": None if args.skip_videos else str(qa_dir / "videos"),
-        "package": None if package_dir is None else str(package_dir),
+        "videos": None if skip_videos else str(qa_dir / "videos"),
+        "package": None if package is None else package["pet_dir"],
+        "timings": timings,
+        "encoded_outputs": encoded,
+        "hash_cache": hashes.stats(),
     }
     summary_path = qa_dir / "run-summary.json"
     summary_path.write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--run-dir", required=True)
+    parser.add_argument("--allow-slot-extraction", action="store_true")
+    parser.add_argument("--skip-videos", action="store_true")
+    parser.add_argument("--skip-package", action="store_true")
+    parser.add_argument(
+        "--package-dir",
+        default="",
+        help="Exact pet package directory. Defaults to ${CODEX_HOME:-$HOME/.codex}/pets/<pet-name>.",
+    )
+    parser.add_argument("--ffmpeg", default="")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Workers for frame extraction, QA and video rendering; 0 uses one per CPU.",
+    )
+    parser.add_argument(
+        "--verify-hashes",
+        action="store_true",
+        help="Rehash every source and decoded strip instead of trusting the run's hash cache.",
+    )
+    parser.add_argument(
+        "--encode-profile",
+        choices=sorted(ENCODE_PROFILES),
+        default=DEFAULT_ENCODE_PROFILE,
+        help="Use draft for fast repair iterations; release compresses the shipped spritesheet hardest.",
+    )
+    parser.add_argument("--allow-synthetic-test-sources", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    summary = finalize_run(
+        Path(args.run_dir).expanduser().resolve(),
+        allow_slot_extraction=args.allow_slot_extraction,
+        skip_videos=args.skip_videos,
+        skip_package=args.skip_package,
+        package_dir=Path(args.package_dir).expanduser().resolve() if args.package_dir else None,
+        ffmpeg=args.ffmpeg,
+        jobs=args.jobs,
+        verify_hashes=args.verify_hashes,
+        encode_profile=args.encode_profile,
+        allow_synthetic_test_sources=args.allow_synthetic_test_sources,
+    )
     print(json.dumps(summary, indent=2))
+    raise SystemExit(0 if summary["ok"] else 1)
 
 
 if __name__ == "__main__":
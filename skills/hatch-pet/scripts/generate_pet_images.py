@@ -5,14 +5,20 @@ from __future__ import annotations
 
 import argparse
 import base64
-import hashlib
 import json
 import os
+import random
 import shutil
 import subprocess
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from pathlib import Path
 
+from hash_cache import HashCache
+from job_manifest import job_list, load_manifest, update_job
+
 ALL_STATES = [
     "idle",
     "running-right",
@@ -25,6 +31,11 @@ ALL_STATES = [
     "review",
 ]
 CANONICAL_BASE_PATH = "references/canonical-base.png"
+TRANSIENT_HTTP_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class TransientImageApiError(RuntimeError):
+    pass
 
 
 def parse_states(raw: str) -> list[str]:
@@ -37,20 +48,6 @@ def parse_states(raw: str) -> list[str]:
     return states
 
 
-def load_manifest(run_dir: Path) -> dict[str, object]:
-    path = run_dir / "imagegen-jobs.json"
-    if not path.exists():
-        raise SystemExit(f"job manifest not found: {path}")
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def manifest_jobs(manifest: dict[str, object]) -> list[dict[str, object]]:
-    jobs = manifest.get("jobs")
-    if not isinstance(jobs, list):
-        raise SystemExit("invalid imagegen-jobs.json: jobs must be a list")
-    return [job for job in jobs if isinstance(job, dict)]
-
-
 def select_jobs(
     manifest: dict[str, object],
     *,
@@ -63,13 +60,38 @@ def select_jobs(
         if not skip_base:
             selected_ids.add("base")
         selected_ids.update(states)
-    selected = [job for job in manifest_jobs(manifest) if job.get("id") in selected_ids]
+    selected = [job for job in job_list(manifest) if job.get("id") in selected_ids]
     missing = selected_ids - {str(job.get("id")) for job in selected}
     if missing:
         raise SystemExit(f"unknown job id(s): {', '.join(sorted(missing))}")
     return selected
 
 
+def post_image_request(command: list[str], output_json: Path) -> dict[str, object]:
+    completed = subprocess.run(
+        [*command, "-w", "%{http_code}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise TransientImageApiError(
+            f"curl exited with {completed.returncode}: {completed.stderr.strip()}"
+        )
+    status = int(completed.stdout.strip() or 0)
+    try:
+        response = json.loads(output_json.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        response = {}
+    if status in TRANSIENT_HTTP_STATUSES or status >= 500:
+        detail = response.get("error") if isinstance(response, dict) else None
+        raise TransientImageApiError(f"image API returned HTTP {status}: {json.dumps(detail)}")
+    if not isinstance(response, dict):
+        raise SystemExit(f"image API returned an unexpected response (HTTP {status})")
+    if response.get("error"):
+        raise SystemExit(json.dumps(response["error"], indent=2))
+    return response
+
+
 def run_image_edit(
     *,
     model: str,
@@ -105,11 +127,7 @@ def run_image_edit(
             str(output_json),
         ]
     )
-    subprocess.run(command, check=True)
-    response = json.loads(output_json.read_text(encoding="utf-8"))
-    if response.get("error"):
-        raise SystemExit(json.dumps(response["error"], indent=2))
-    return response
+    return post_image_request(command, output_json)
 
 
 def run_image_generation(
@@ -140,11 +158,27 @@ def run_image_generation(
         "-o",
         str(output_json),
     ]
-    subprocess.run(command, check=True)
-    response = json.loads(output_json.read_text(encoding="utf-8"))
-    if response.get("error"):
-        raise SystemExit(json.dumps(response["error"], indent=2))
-    return response
+    return post_image_request(command, output_json)
+
+
+def with_retries(
+    call: Callable[[], dict[str, object]],
+    *,
+    job_id: str,
+    retries: int,
+    backoff: float,
+) -> dict[str, object]:
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except TransientImageApiError as exc:
+            if attempt >= retries:
+                raise SystemExit(f"{exc} (gave up after {attempt + 1} attempts)") from exc
+            delay = backoff * 2**attempt + random.uniform(0, backoff)
+            print(f"Retrying {job_id} in {delay:.1f}s: {exc}", flush=True)
+            time.sleep(delay)
+            attempt += 1
 
 
 def decode_response(response: dict[str, object], output_image: Path) -> None:
@@ -158,20 +192,12 @@ def decode_response(response: dict[str, object], output_image: Path) -> None:
     output_image.write_bytes(base64.b64decode(first["b64_json"]))
 
 
-def file_sha256(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as file:
-        for chunk in iter(lambda: file.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
-
-
-def complete_job(job: dict[str, object], output_path: Path) -> None:
+def complete_job(job: dict[str, object], output_path: Path, output_sha256: str) -> None:
     job["status"] = "complete"
     job["source_path"] = str(output_path)
     job["source_provenance"] = "secondary-fallback-image-api"
-    job["source_sha256"] = file_sha256(output_path)
-    job["output_sha256"] = file_sha256(output_path)
+    job["source_sha256"] = output_sha256
+    job["output_sha256"] = output_sha256
     job["completed_at"] = datetime.now(timezone.utc).isoformat()
     job["secondary_fallback"] = True
     for key in [
@@ -186,7 +212,7 @@ def complete_job(job: dict[str, object], output_path: Path) -> None:
 
 
 def write_canonical_base(
-    run_dir: Path, manifest: dict[str, object], output_image: Path
+    run_dir: Path, manifest: dict[str, object], output_image: Path, output_sha256: str
 ) -> None:
     canonical = run_dir / CANONICAL_BASE_PATH
     canonical.parent.mkdir(parents=True, exist_ok=True)
@@ -194,7 +220,7 @@ def write_canonical_base(
     reference = {
         "path": CANONICAL_BASE_PATH,
         "source_job": "base",
-        "sha256": file_sha256(canonical),
+        "sha256": output_sha256,
     }
     manifest["canonical_identity_reference"] = reference
     request_path = run_dir / "pet_request.json"
@@ -219,6 +245,63 @@ def path_list(run_dir: Path, job: dict[str, object]) -> list[Path]:
     return paths
 
 
+def job_dependencies(job: dict[str, object]) -> list[str]:
+    deps = job.get("depends_on", [])
+    if not isinstance(deps, list):
+        return []
+    return [dep for dep in deps if isinstance(dep, str)]
+
+
+def schedule_jobs(
+    jobs: list[dict[str, object]],
+    *,
+    satisfied: set[str],
+    max_parallel: int,
+    run_job: Callable[[dict[str, object]], None],
+    on_complete: Callable[[dict[str, object]], None],
+    on_failure: Callable[[dict[str, object], str], None],
+) -> dict[str, str]:
+    pending = {str(job.get("id")): job for job in jobs}
+    done = set(satisfied)
+    failures: dict[str, str] = {}
+    running: dict[Future[None], str] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        while pending or running:
+            for job_id, job in list(pending.items()):
+                deps = job_dependencies(job)
+                failed_deps = [dep for dep in deps if dep in failures]
+                if failed_deps:
+                    del pending[job_id]
+                    failures[job_id] = f"dependency failed: {', '.join(failed_deps)}"
+                    on_failure(job, failures[job_id])
+                elif all(dep in done for dep in deps):
+                    del pending[job_id]
+                    running[executor.submit(run_job, job)] = job_id
+
+            if not running:
+                for job_id, job in pending.items():
+                    failures[job_id] = "dependencies can never be satisfied: " + ", ".join(
+                        dep for dep in job_dependencies(job) if dep not in done
+                    )
+                    on_failure(job, failures[job_id])
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job_id = running.pop(future)
+                job = next(job for job in jobs if str(job.get("id")) == job_id)
+                try:
+                    future.result()
+                except (SystemExit, OSError, subprocess.SubprocessError, ValueError) as exc:
+                    failures[job_id] = str(exc)
+                    on_failure(job, failures[job_id])
+                    continue
+                done.add(job_id)
+                on_complete(job)
+    return failures
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--run-dir", required=True)
@@ -227,6 +310,19 @@ def main() -> None:
     parser.add_argument("--states", default="all")
     parser.add_argument("--job-id", action="append", default=[])
     parser.add_argument("--skip-base", action="store_true")
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=9,
+        help="Maximum number of ready jobs to generate at the same time.",
+    )
+    parser.add_argument("--retries", type=int, default=3, help="Retries for transient API failures.")
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=5.0,
+        help="Base delay in seconds for exponential retry backoff.",
+    )
     args = parser.parse_args()
 
     api_key = os.environ.get("OPENAI_API_KEY")
@@ -234,7 +330,6 @@ def main() -> None:
         raise SystemExit("OPENAI_API_KEY is not set")
 
     run_dir = Path(args.run_dir).expanduser().resolve()
-    manifest_path = run_dir / "imagegen-jobs.json"
     manifest = load_manifest(run_dir)
     jobs = select_jobs(
         manifest,
@@ -244,8 +339,25 @@ def main() -> None:
     )
     raw_dir = run_dir / "raw"
 
-    completed = []
+    selected_ids = {str(job.get("id")) for job in jobs}
+    manifest_complete = {
+        str(job.get("id"))
+        for job in job_list(manifest)
+        if job.get("status") == "complete" and str(job.get("id")) not in selected_ids
+    }
     for job in jobs:
+        unavailable = [
+            dep
+            for dep in job_dependencies(job)
+            if dep not in manifest_complete and dep not in selected_ids
+        ]
+        if unavailable:
+            raise SystemExit(
+                f"job {job.get('id')} depends on incomplete job(s) that were not selected: "
+                + ", ".join(unavailable)
+            )
+
+    def run_job(job: dict[str, object]) -> None:
         job_id = str(job.get("id"))
         prompt_raw = job.get("prompt_file")
         output_raw = job.get("output_path")
@@ -253,34 +365,80 @@ def main() -> None:
             raise SystemExit(f"job {job_id} is missing prompt_file or output_path")
         prompt_file = run_dir / prompt_raw
         output_image = run_dir / output_raw
-        print(f"Generating {job_id} with secondary fallback")
+        print(f"Generating {job_id} with secondary fallback", flush=True)
         image_paths = path_list(run_dir, job)
+        output_json = raw_dir / f"{job_id}.response.json"
         if image_paths:
-            response = run_image_edit(
-                model=args.model,
-                prompt_file=prompt_file,
-                image_paths=image_paths,
-                output_json=raw_dir / f"{job_id}.response.json",
-                size=args.size,
-                api_key=api_key,
+            response = with_retries(
+                lambda: run_image_edit(
+                    model=args.model,
+                    prompt_file=prompt_file,
+                    image_paths=image_paths,
+                    output_json=output_json,
+                    size=args.size,
+                    api_key=api_key,
+                ),
+                job_id=job_id,
+                retries=args.retries,
+                backoff=args.retry_backoff,
             )
         else:
-            response = run_image_generation(
-                model=args.model,
-                prompt_file=prompt_file,
-                output_json=raw_dir / f"{job_id}.response.json",
-                size=args.size,
-                api_key=api_key,
+            response = with_retries(
+                lambda: run_image_generation(
+                    model=args.model,
+                    prompt_file=prompt_file,
+                    output_json=output_json,
+                    size=args.size,
+                    api_key=api_key,
+                ),
+                job_id=job_id,
+                retries=args.retries,
+                backoff=args.retry_backoff,
             )
         decode_response(response, output_image)
-        complete_job(job, output_image)
-        if job_id == "base":
-            job["canonical_reference_path"] = CANONICAL_BASE_PATH
-            write_canonical_base(run_dir, manifest, output_image)
-        completed.append({"job_id": job_id, "output": str(output_image)})
 
-    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
-    print(json.dumps({"ok": True, "completed": completed}, indent=2))
+    completed = []
+    hashes = HashCache(run_dir)
+
+    def on_complete(job: dict[str, object]) -> None:
+        job_id = str(job.get("id"))
+        output_image = run_dir / str(job.get("output_path"))
+        output_sha256 = hashes.sha256(output_image)
+
+        def record(fresh: dict[str, object], manifest: dict[str, object]) -> None:
+            complete_job(fresh, output_image, output_sha256)
+            if job_id == "base":
+                fresh["canonical_reference_path"] = CANONICAL_BASE_PATH
+                write_canonical_base(run_dir, manifest, output_image, output_sha256)
+
+        update_job(run_dir, job_id, record)
+        completed.append({"job_id": job_id, "output": str(output_image)})
+        print(f"Completed {job_id}", flush=True)
+
+    def on_failure(job: dict[str, object], error: str) -> None:
+        update_job(run_dir, str(job.get("id")), lambda fresh, _manifest: fresh.update(last_error=error))
+        print(f"Failed {job.get('id')}: {error}", flush=True)
+
+    failures = schedule_jobs(
+        jobs,
+        satisfied=manifest_complete,
+        max_parallel=args.max_parallel,
+        run_job=run_job,
+        on_complete=on_complete,
+        on_failure=on_failure,
+    )
+    hashes.save()
+    print(
+        json.dumps(
+            {
+                "ok": not failures,
+                "completed": completed,
+                "failed": [{"job_id": job_id, "error": error} for job_id, error in failures.items()],
+            },
+            indent=2,
+        )
+    )
+    raise SystemExit(0 if not failures else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""Persistent sha256 cache for Codex pet run provenance hashes."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from job_manifest import file_lock, write_json_atomic
+
+CACHE_NAME = ".hash-cache.json"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(stat: os.stat_result) -> dict[str, int]:
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+
+def load_entries(path: Path) -> dict[str, dict[str, object]]:
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    entries = payload.get("entries") if isinstance(payload, dict) else None
+    if not isinstance(entries, dict):
+        return {}
+    return {key: value for key, value in entries.items() if isinstance(value, dict)}
+
+
+class HashCache:
+    """sha256 lookups keyed by (path, size, mtime_ns, inode).
+
+    With verify=True every lookup rereads the file, and the fresh digests
+    replace whatever the cache held.
+    """
+
+    def __init__(self, run_dir: Path, *, verify: bool = False) -> None:
+        self.path = run_dir / CACHE_NAME
+        self.verify = verify
+        self.entries = load_entries(self.path)
+        self.updated: dict[str, dict[str, object]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def sha256(self, path: Path) -> str:
+        resolved = path.resolve()
+        key = str(resolved)
+        signature = file_signature(resolved.stat())
+        entry = self.entries.get(key)
+        if (
+            not self.verify
+            and entry is not None
+            and isinstance(entry.get("sha256"), str)
+            and all(entry.get(field) == value for field, value in signature.items())
+        ):
+            self.hits += 1
+            return str(entry["sha256"])
+
+        self.misses += 1
+        digest = file_sha256(resolved)
+        if file_signature(resolved.stat()) == signature:
+            entry = {**signature, "sha256": digest}
+            self.entries[key] = entry
+            self.updated[key] = entry
+        return digest
+
+    def save(self) -> None:
+        if not self.updated or not self.path.parent.is_dir():
+            return
+        with file_lock(self.path.parent / f"{CACHE_NAME}.lock"):
+            entries = load_entries(self.path)
+            entries.update(self.updated)
+            entries = {key: value for key, value in entries.items() if Path(key).exists()}
+            write_json_atomic(self.path, {"version": 1, "entries": entries})
+        self.updated = {}
+
+    def stats(self) -> dict[str, object]:
+        return {"hits": self.hits, "misses": self.misses, "verify": self.verify}
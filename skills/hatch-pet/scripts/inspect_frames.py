@@ -5,66 +5,88 @@ from __future__ import annotations
 
 import argparse
 import json
-import math
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from statistics import median
 
+import numpy as np
 from PIL import Image
 
-CELL_WIDTH = 192
-CELL_HEIGHT = 208
-ROW_FRAME_COUNTS = {
-    "idle": 6,
-    "running-right": 8,
-    "running-left": 8,
-    "waving": 4,
-    "jumping": 5,
-    "failed": 8,
-    "waiting": 6,
-    "running": 6,
-    "review": 6,
-}
+from extract_strip_frames import chroma_squared_distance, squared_distance_limit, worker_count
+from pet_atlas import CELL_HEIGHT, CELL_WIDTH, ROW_FRAME_COUNTS
+
 IMAGE_SUFFIXES = {".png", ".webp", ".jpg", ".jpeg"}
+DEFAULT_MIN_USED_PIXELS = 400
+DEFAULT_EDGE_MARGIN = 2
+DEFAULT_EDGE_PIXEL_THRESHOLD = 24
+DEFAULT_CHROMA_ADJACENT_THRESHOLD = 150.0
+DEFAULT_CHROMA_ADJACENT_PIXEL_THRESHOLD = 800
+DEFAULT_SMALL_OUTLIER_RATIO = 0.35
+DEFAULT_LARGE_OUTLIER_RATIO = 2.75
 
 
-def alpha_nonzero_count(image: Image.Image) -> int:
-    alpha = image if image.mode == "L" else image.getchannel("A")
-    return sum(alpha.histogram()[1:])
+def frame_metrics(
+    frame: Image.Image,
+    chroma_key: tuple[int, int, int] | None,
+    chroma_threshold: float,
+    edge_margin: int,
+) -> dict[str, object]:
+    pixels = np.asarray(frame.convert("RGBA"))
+    height, width = pixels.shape[:2]
+    visible = pixels[..., 3] > 0
+
+    rows = np.flatnonzero(visible.any(axis=1))
+    columns = np.flatnonzero(visible.any(axis=0))
+    bbox = None
+    if rows.size:
+        bbox = [int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1]
+
+    # Matches the previous four-box crop sum, so corner pixels count twice.
+    margin = max(0, edge_margin)
+    edge_pixels = (
+        int(np.count_nonzero(visible[:margin]))
+        + int(np.count_nonzero(visible[max(0, height - margin) :]))
+        + int(np.count_nonzero(visible[:, :margin]))
+        + int(np.count_nonzero(visible[:, max(0, width - margin) :]))
+    )
 
+    chroma_adjacent_pixels = 0
+    if chroma_key is not None:
+        near_key = chroma_squared_distance(pixels, chroma_key) <= squared_distance_limit(
+            chroma_threshold
+        )
+        chroma_adjacent_pixels = int(np.count_nonzero(near_key & (pixels[..., 3] > 16)))
 
-def edge_alpha_count(image: Image.Image, margin: int) -> int:
-    alpha = image.getchannel("A")
-    width, height = alpha.size
-    total = 0
-    for box in (
-        (0, 0, width, margin),
-        (0, height - margin, width, height),
-        (0, 0, margin, height),
-        (width - margin, 0, width, height),
-    ):
-        total += alpha_nonzero_count(alpha.crop(box))
-    return total
+    return {
+        "width": width,
+        "height": height,
+        "nontransparent_pixels": int(np.count_nonzero(visible)),
+        "bbox": bbox,
+        "edge_pixels": edge_pixels,
+        "chroma_adjacent_pixels": chroma_adjacent_pixels,
+    }
 
 
-def color_distance(left: tuple[int, int, int], right: tuple[int, int, int]) -> float:
-    return math.sqrt(sum((left[index] - right[index]) ** 2 for index in range(3)))
+def measure_frame(
+    frame_path: Path,
+    frame: Image.Image | None,
+    chroma_key: tuple[int, int, int] | None,
+    chroma_threshold: float,
+    edge_margin: int,
+) -> dict[str, object]:
+    if frame is None:
+        with Image.open(frame_path) as opened:
+            frame = opened.convert("RGBA")
+    return {"file": str(frame_path), **frame_metrics(frame, chroma_key, chroma_threshold, edge_margin)}
 
 
-def chroma_adjacent_count(
-    image: Image.Image,
-    chroma_key: tuple[int, int, int] | None,
-    threshold: float,
-) -> int:
-    if chroma_key is None:
-        return 0
-    rgba = image.convert("RGBA")
-    data = rgba.tobytes()
-    count = 0
-    for index in range(0, len(data), 4):
-        red, green, blue, alpha = data[index : index + 4]
-        if alpha > 16 and color_distance((red, green, blue), chroma_key) <= threshold:
-            count += 1
-    return count
+def measure_frames(tasks: list[tuple[object, ...]], jobs: int) -> list[dict[str, object]]:
+    workers = worker_count(jobs, len(tasks))
+    if workers == 1:
+        return [measure_frame(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(measure_frame, *task) for task in tasks]
+        return [future.result() for future in futures]
 
 
 def frame_files(state_dir: Path) -> list[Path]:
@@ -107,15 +129,19 @@ def load_chroma_key(frames_root: Path) -> tuple[int, int, int] | None:
 
 
 def inspect_state(
-    frames_root: Path,
     state: str,
     expected_count: int,
+    actual_count: int,
+    measured: list[dict[str, object]],
     manifest_rows: dict[str, dict[str, object]],
-    chroma_key: tuple[int, int, int] | None,
-    args: argparse.Namespace,
+    *,
+    require_components: bool,
+    min_used_pixels: int,
+    edge_pixel_threshold: int,
+    chroma_adjacent_pixel_threshold: int,
+    small_outlier_ratio: float,
+    large_outlier_ratio: float,
 ) -> dict[str, object]:
-    state_dir = frames_root / state
-    files = frame_files(state_dir)
     row_errors: list[str] = []
     row_warnings: list[str] = []
     frames: list[dict[str, object]] = []
@@ -123,10 +149,10 @@ def inspect_state(
     manifest_row = manifest_rows.get(state, {})
     method = manifest_row.get("method")
 
-    if len(files) != expected_count:
-        row_errors.append(f"expected {expected_count} frame files for {state}, found {len(files)}")
+    if actual_count != expected_count:
+        row_errors.append(f"expected {expected_count} frame files for {state}, found {actual_count}")
 
-    if args.require_components and method and method != "components":
+    if require_components and method and method != "components":
         row_errors.append(
             f"{state} used extraction method {method}; regenerate the row or inspect slot slicing"
         )
@@ -135,43 +161,27 @@ def inspect_state(
             f"{state} used extraction method {method}; component extraction is preferred"
         )
 
-    for index, frame_path in enumerate(files[:expected_count]):
-        with Image.open(frame_path) as opened:
-            frame = opened.convert("RGBA")
-        nontransparent = alpha_nonzero_count(frame)
-        bbox = frame.getbbox()
-        edge_pixels = edge_alpha_count(frame, args.edge_margin)
-        chroma_adjacent_pixels = chroma_adjacent_count(
-            frame,
-            chroma_key,
-            args.chroma_adjacent_threshold,
-        )
-        info = {
-            "index": index,
-            "file": str(frame_path),
-            "width": frame.width,
-            "height": frame.height,
-            "nontransparent_pixels": nontransparent,
-            "bbox": list(bbox) if bbox else None,
-            "edge_pixels": edge_pixels,
-            "chroma_adjacent_pixels": chroma_adjacent_pixels,
-        }
+    for index, metrics in enumerate(measured[:expected_count]):
+        info = {"index": index, **metrics}
+        nontransparent = info["nontransparent_pixels"]
+        edge_pixels = info["edge_pixels"]
+        chroma_adjacent_pixels = info["chroma_adjacent_pixels"]
         frames.append(info)
         areas.append(nontransparent)
 
-        if frame.size != (CELL_WIDTH, CELL_HEIGHT):
+        if (info["width"], info["height"]) != (CELL_WIDTH, CELL_HEIGHT):
             row_errors.append(
-                f"{state} frame {index:02d} is {frame.width}x{frame.height}; expected {CELL_WIDTH}x{CELL_HEIGHT}"
+                f"{state} frame {index:02d} is {info['width']}x{info['height']}; expected {CELL_WIDTH}x{CELL_HEIGHT}"
             )
-        if nontransparent < args.min_used_pixels:
+        if nontransparent < min_used_pixels:
             row_errors.append(
                 f"{state} frame {index:02d} is empty or too sparse ({nontransparent} pixels)"
             )
-        if edge_pixels > args.edge_pixel_threshold:
+        if edge_pixels > edge_pixel_threshold:
             row_warnings.append(
                 f"{state} frame {index:02d} has {edge_pixels} non-transparent pixels near the cell edge"
             )
-        if chroma_adjacent_pixels > args.chroma_adjacent_pixel_threshold:
+        if chroma_adjacent_pixels > chroma_adjacent_pixel_threshold:
             row_errors.append(
                 f"{state} frame {index:02d} has {chroma_adjacent_pixels} non-transparent pixels close to the chroma key"
             )
@@ -179,11 +189,11 @@ def inspect_state(
     if areas:
         row_median = median(areas)
         for index, area in enumerate(areas[:expected_count]):
-            if row_median > 0 and area < row_median * args.small_outlier_ratio:
+            if row_median > 0 and area < row_median * small_outlier_ratio:
                 row_warnings.append(
                     f"{state} frame {index:02d} is much smaller than the row median ({area} vs {row_median:.0f})"
                 )
-            if row_median > 0 and area > row_median * args.large_outlier_ratio:
+            if row_median > 0 and area > row_median * large_outlier_ratio:
                 row_warnings.append(
                     f"{state} frame {index:02d} is much larger than the row median ({area} vs {row_median:.0f})"
                 )
@@ -191,7 +201,7 @@ def inspect_state(
     return {
         "state": state,
         "expected_frames": expected_count,
-        "actual_frames": len(files),
+        "actual_frames": actual_count,
         "extraction_method": method,
         "ok": not row_errors,
         "errors": row_errors,
@@ -200,34 +210,87 @@ def inspect_state(
     }
 
 
-def main() -> None:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--frames-root", required=True)
     parser.add_argument("--json-out", required=True)
-    parser.add_argument("--min-used-pixels", type=int, default=400)
-    parser.add_argument("--edge-margin", type=int, default=2)
-    parser.add_argument("--edge-pixel-threshold", type=int, default=24)
-    parser.add_argument("--chroma-adjacent-threshold", type=float, default=150.0)
-    parser.add_argument("--chroma-adjacent-pixel-threshold", type=int, default=800)
-    parser.add_argument("--small-outlier-ratio", type=float, default=0.35)
-    parser.add_argument("--large-outlier-ratio", type=float, default=2.75)
+    parser.add_argument("--min-used-pixels", type=int, default=DEFAULT_MIN_USED_PIXELS)
+    parser.add_argument("--edge-margin", type=int, default=DEFAULT_EDGE_MARGIN)
+    parser.add_argument("--edge-pixel-threshold", type=int, default=DEFAULT_EDGE_PIXEL_THRESHOLD)
+    parser.add_argument(
+        "--chroma-adjacent-threshold", type=float, default=DEFAULT_CHROMA_ADJACENT_THRESHOLD
+    )
+    parser.add_argument(
+        "--chroma-adjacent-pixel-threshold",
+        type=int,
+        default=DEFAULT_CHROMA_ADJACENT_PIXEL_THRESHOLD,
+    )
+    parser.add_argument("--small-outlier-ratio", type=float, default=DEFAULT_SMALL_OUTLIER_RATIO)
+    parser.add_argument("--large-outlier-ratio", type=float, default=DEFAULT_LARGE_OUTLIER_RATIO)
     parser.add_argument(
         "--require-components",
         action="store_true",
         help="Fail rows that fell back to equal-slot extraction.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Inspect frames in this many worker processes; 0 uses one per CPU.",
+    )
+    return parser
 
-    frames_root = Path(args.frames_root).expanduser().resolve()
+
+def review_frames(
+    frames_root: Path,
+    row_frames: dict[str, list[tuple[Path, Image.Image]]] | None = None,
+    *,
+    jobs: int = 1,
+    require_components: bool = False,
+    min_used_pixels: int = DEFAULT_MIN_USED_PIXELS,
+    edge_margin: int = DEFAULT_EDGE_MARGIN,
+    edge_pixel_threshold: int = DEFAULT_EDGE_PIXEL_THRESHOLD,
+    chroma_adjacent_threshold: float = DEFAULT_CHROMA_ADJACENT_THRESHOLD,
+    chroma_adjacent_pixel_threshold: int = DEFAULT_CHROMA_ADJACENT_PIXEL_THRESHOLD,
+    small_outlier_ratio: float = DEFAULT_SMALL_OUTLIER_RATIO,
+    large_outlier_ratio: float = DEFAULT_LARGE_OUTLIER_RATIO,
+) -> dict[str, object]:
     manifest_rows = load_manifest(frames_root)
     chroma_key = load_chroma_key(frames_root)
-    rows = [
-        inspect_state(frames_root, state, count, manifest_rows, chroma_key, args)
+    sources: dict[str, list[tuple[Path, Image.Image | None]]] = {}
+    for state in ROW_FRAME_COUNTS:
+        if row_frames is None:
+            sources[state] = [(path, None) for path in frame_files(frames_root / state)]
+        else:
+            sources[state] = list(row_frames.get(state, []))
+
+    tasks = [
+        (path, frame, chroma_key, chroma_adjacent_threshold, edge_margin)
         for state, count in ROW_FRAME_COUNTS.items()
+        for path, frame in sources[state][:count]
     ]
+    measured = iter(measure_frames(tasks, jobs))
+    rows = []
+    for state, count in ROW_FRAME_COUNTS.items():
+        state_metrics = [next(measured) for _ in sources[state][:count]]
+        rows.append(
+            inspect_state(
+                state,
+                count,
+                len(sources[state]),
+                state_metrics,
+                manifest_rows,
+                require_components=require_components,
+                min_used_pixels=min_used_pixels,
+                edge_pixel_threshold=edge_pixel_threshold,
+                chroma_adjacent_pixel_threshold=chroma_adjacent_pixel_threshold,
+                small_outlier_ratio=small_outlier_ratio,
+                large_outlier_ratio=large_outlier_ratio,
+            )
+        )
     errors = [error for row in rows for error in row["errors"]]
     warnings = [warning for row in rows for warning in row["warnings"]]
-    result = {
+    return {
         "ok": not errors,
         "frames_root": str(frames_root),
         "errors": errors,
@@ -235,9 +298,29 @@ def main() -> None:
         "rows": rows,
     }
 
-    json_out = Path(args.json_out).expanduser().resolve()
+
+def write_review(result: dict[str, object], json_out: Path) -> None:
     json_out.parent.mkdir(parents=True, exist_ok=True)
     json_out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+
+    frames_root = Path(args.frames_root).expanduser().resolve()
+    result = review_frames(
+        frames_root,
+        jobs=args.jobs,
+        require_components=args.require_components,
+        min_used_pixels=args.min_used_pixels,
+        edge_margin=args.edge_margin,
+        edge_pixel_threshold=args.edge_pixel_threshold,
+        chroma_adjacent_threshold=args.chroma_adjacent_threshold,
+        chroma_adjacent_pixel_threshold=args.chroma_adjacent_pixel_threshold,
+        small_outlier_ratio=args.small_outlier_ratio,
+        large_outlier_ratio=args.large_outlier_ratio,
+    )
+    write_review(result, Path(args.json_out).expanduser().resolve())
     print(json.dumps({k: v for k, v in result.items() if k != "rows"}, indent=2))
     raise SystemExit(0 if result["ok"] else 1)
 
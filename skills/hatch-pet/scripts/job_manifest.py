@@ -0,0 +1,121 @@
+"""Locked, atomic access to a Codex pet run's imagegen-jobs.json."""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import TypeVar
+
+MANIFEST_NAME = "imagegen-jobs.json"
+
+T = TypeVar("T")
+
+
+class ManifestConflict(RuntimeError):
+    pass
+
+
+def manifest_path(run_dir: Path) -> Path:
+    return run_dir / MANIFEST_NAME
+
+
+def job_list(manifest: dict[str, object]) -> list[dict[str, object]]:
+    jobs = manifest.get("jobs")
+    if not isinstance(jobs, list):
+        raise SystemExit("invalid imagegen-jobs.json: jobs must be a list")
+    return [job for job in jobs if isinstance(job, dict)]
+
+
+def find_job(manifest: dict[str, object], job_id: str) -> dict[str, object]:
+    for job in job_list(manifest):
+        if job.get("id") == job_id:
+            return job
+    raise SystemExit(f"unknown job id: {job_id}")
+
+
+def content_version(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_manifest(run_dir: Path) -> tuple[dict[str, object], str]:
+    path = manifest_path(run_dir)
+    if not path.exists():
+        raise SystemExit(f"job manifest not found: {path}")
+    data = path.read_bytes()
+    return json.loads(data.decode("utf-8")), content_version(data)
+
+
+def load_manifest(run_dir: Path) -> dict[str, object]:
+    return read_manifest(run_dir)[0]
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: Path) -> Iterator[None]:
+    with lock_path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def manifest_lock(run_dir: Path) -> contextlib.AbstractContextManager[None]:
+    return file_lock(run_dir / f".{MANIFEST_NAME}.lock")
+
+
+def write_json_atomic(path: Path, payload: object) -> bytes:
+    data = (json.dumps(payload, indent=2) + "\n").encode("utf-8")
+    descriptor, temp_raw = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    temp_path = Path(temp_raw)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return data
+
+
+def write_manifest_atomic(run_dir: Path, manifest: dict[str, object]) -> str:
+    return content_version(write_json_atomic(manifest_path(run_dir), manifest))
+
+
+def _swap_locked(run_dir: Path, expected_version: str, manifest: dict[str, object]) -> str:
+    _current, version = read_manifest(run_dir)
+    if version != expected_version:
+        raise ManifestConflict(
+            f"{manifest_path(run_dir)} changed since it was read; reload and retry"
+        )
+    return write_manifest_atomic(run_dir, manifest)
+
+
+def compare_and_swap(run_dir: Path, expected_version: str, manifest: dict[str, object]) -> str:
+    with manifest_lock(run_dir):
+        return _swap_locked(run_dir, expected_version, manifest)
+
+
+def update_manifest(run_dir: Path, mutate: Callable[[dict[str, object]], T]) -> T:
+    # The lock serializes cooperating writers; the version check still catches
+    # anything that rewrote the file without it (a hand edit, an old script).
+    with manifest_lock(run_dir):
+        manifest, version = read_manifest(run_dir)
+        result = mutate(manifest)
+        _swap_locked(run_dir, version, manifest)
+        return result
+
+
+def update_job(
+    run_dir: Path,
+    job_id: str,
+    mutate: Callable[[dict[str, object], dict[str, object]], T],
+) -> T:
+    return update_manifest(run_dir, lambda manifest: mutate(find_job(manifest, job_id), manifest))
@@ -12,7 +12,7 @@ from pathlib import Path
 
 from PIL import Image
 
-ATLAS_SIZE = (1536, 1872)
+from pet_atlas import ATLAS_SIZE
 
 
 def default_codex_home() -> Path:
@@ -52,56 +52,68 @@ def write_webp_spritesheet(source: Path, target: Path, source_format: str) -> No
         )
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--pet-name", default="")
-    parser.add_argument("--display-name", default="")
-    parser.add_argument("--description", required=True)
-    parser.add_argument("--spritesheet", required=True)
-    parser.add_argument("--codex-home", default=str(default_codex_home()))
-    parser.add_argument(
-        "--output-dir",
-        help="Exact pet package directory. Defaults to ${CODEX_HOME:-$HOME/.codex}/pets/<pet-name>.",
-    )
-    parser.add_argument("--force", action="store_true")
-    args = parser.parse_args()
-
-    raw_pet_name = (args.pet_name or args.display_name).strip()
+def package_pet(
+    *,
+    pet_name: str,
+    display_name: str,
+    description: str,
+    spritesheet: Path,
+    codex_home: Path,
+    output_dir: Path | None = None,
+    force: bool = False,
+) -> dict[str, object]:
+    raw_pet_name = (pet_name or display_name).strip()
     if not raw_pet_name:
         raise SystemExit("pet name is required")
     pet_id = slugify(raw_pet_name)
     if not pet_id:
         raise SystemExit("pet name must contain at least one letter or digit")
-    display_name = (args.display_name or raw_pet_name).strip()
-
-    source = Path(args.spritesheet).expanduser().resolve()
-    source_format = validate_spritesheet(source)
-    target_dir = (
-        Path(args.output_dir).expanduser().resolve()
-        if args.output_dir
-        else Path(args.codex_home).expanduser().resolve() / "pets" / pet_id
-    )
+    display_name = (display_name or raw_pet_name).strip()
+
+    source_format = validate_spritesheet(spritesheet)
+    target_dir = output_dir if output_dir is not None else codex_home / "pets" / pet_id
     target_dir.mkdir(parents=True, exist_ok=True)
 
     target_sheet = target_dir / "spritesheet.webp"
     manifest_path = target_dir / "pet.json"
-    if not args.force and (target_sheet.exists() or manifest_path.exists()):
+    if not force and (target_sheet.exists() or manifest_path.exists()):
         raise SystemExit(f"{target_dir} already contains pet files; pass --force to overwrite")
 
-    write_webp_spritesheet(source, target_sheet, source_format)
+    write_webp_spritesheet(spritesheet, target_sheet, source_format)
     manifest = {
         "id": pet_id,
         "displayName": display_name,
-        "description": args.description,
+        "description": description,
         "spritesheetPath": target_sheet.name,
     }
     manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return {"ok": True, "pet_dir": str(target_dir), "manifest": str(manifest_path)}
 
-    print(
-        json.dumps(
-            {"ok": True, "pet_dir": str(target_dir), "manifest": str(manifest_path)}, indent=2
-        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pet-name", default="")
+    parser.add_argument("--display-name", default="")
+    parser.add_argument("--description", required=True)
+    parser.add_argument("--spritesheet", required=True)
+    parser.add_argument("--codex-home", default=str(default_codex_home()))
+    parser.add_argument(
+        "--output-dir",
+        help="Exact pet package directory. Defaults to ${CODEX_HOME:-$HOME/.codex}/pets/<pet-name>.",
+    )
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    result = package_pet(
+        pet_name=args.pet_name,
+        display_name=args.display_name,
+        description=args.description,
+        spritesheet=Path(args.spritesheet).expanduser().resolve(),
+        codex_home=Path(args.codex_home).expanduser().resolve(),
+        output_dir=Path(args.output_dir).expanduser().resolve() if args.output_dir else None,
+        force=args.force,
     )
+    print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":
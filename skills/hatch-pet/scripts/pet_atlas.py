@@ -0,0 +1,114 @@
+"""Shared Codex pet atlas geometry and a decoded, zero-copy atlas view."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+COLUMNS = 8
+ROWS = 9
+CELL_WIDTH = 192
+CELL_HEIGHT = 208
+ATLAS_WIDTH = COLUMNS * CELL_WIDTH
+ATLAS_HEIGHT = ROWS * CELL_HEIGHT
+ATLAS_SIZE = (ATLAS_WIDTH, ATLAS_HEIGHT)
+ATLAS_ASPECT_RATIO = ATLAS_WIDTH / ATLAS_HEIGHT
+ROW_SPECS = [
+    ("idle", 0, 6),
+    ("running-right", 1, 8),
+    ("running-left", 2, 8),
+    ("waving", 3, 4),
+    ("jumping", 4, 5),
+    ("failed", 5, 8),
+    ("waiting", 6, 6),
+    ("running", 7, 6),
+    ("review", 8, 6),
+]
+ROW_FRAME_COUNTS = {state: frame_count for state, _row, frame_count in ROW_SPECS}
+STATE_ROWS = {state: row for state, row, _frame_count in ROW_SPECS}
+ROW_OFFSETS = tuple(row * CELL_HEIGHT for row in range(ROWS))
+COLUMN_OFFSETS = tuple(column * CELL_WIDTH for column in range(COLUMNS))
+USED_COLUMNS = np.array(
+    [[column < frame_count for column in range(COLUMNS)] for _state, _row, frame_count in ROW_SPECS]
+)
+USED_COLUMNS.flags.writeable = False
+
+
+def cell_box(row: int, column: int) -> tuple[int, int, int, int]:
+    left = COLUMN_OFFSETS[column]
+    top = ROW_OFFSETS[row]
+    return left, top, left + CELL_WIDTH, top + CELL_HEIGHT
+
+
+@lru_cache(maxsize=None)
+def checker_array(size: tuple[int, int], square: int = 16) -> np.ndarray:
+    width, height = size
+    yy, xx = np.mgrid[0:height, 0:width]
+    dark = (xx // square + yy // square) % 2 == 1
+    pixels = np.where(dark[..., None], np.uint8(0xE8), np.uint8(0xFF)).astype(np.uint8)
+    pixels = np.repeat(pixels, 3, axis=2)
+    pixels.flags.writeable = False
+    return pixels
+
+
+def checker(size: tuple[int, int], square: int = 16) -> Image.Image:
+    return Image.fromarray(checker_array(size, square), "RGB")
+
+
+def over_checker(rgba: np.ndarray, square: int = 16) -> np.ndarray:
+    """Blend an RGBA array over the checker exactly like Image.paste with an alpha mask."""
+    background = checker_array((rgba.shape[1], rgba.shape[0]), square).astype(np.uint32)
+    alpha = rgba[..., 3:4].astype(np.uint32)
+    blended = background * (255 - alpha) + rgba[..., :3].astype(np.uint32) * alpha + 128
+    return (((blended >> 8) + blended) >> 8).astype(np.uint8)
+
+
+class Atlas:
+    """A decoded RGBA atlas whose cells are read-only views into one buffer."""
+
+    def __init__(self, pixels: np.ndarray) -> None:
+        if pixels.shape != (ATLAS_HEIGHT, ATLAS_WIDTH, 4) or pixels.dtype != np.uint8:
+            raise ValueError(
+                f"atlas pixels must be uint8 {ATLAS_HEIGHT}x{ATLAS_WIDTH}x4; got {pixels.dtype} {pixels.shape}"
+            )
+        self.pixels = pixels.view()
+        self.pixels.flags.writeable = False
+        self.cells = self.pixels.reshape(ROWS, CELL_HEIGHT, COLUMNS, CELL_WIDTH, 4).swapaxes(1, 2)
+        self._image: Image.Image | None = None
+
+    @classmethod
+    def from_image(cls, image: Image.Image, *, fit: bool = False) -> Atlas:
+        pixels = np.asarray(image.convert("RGBA") if image.mode != "RGBA" else image)
+        if fit and pixels.shape[:2] != (ATLAS_HEIGHT, ATLAS_WIDTH):
+            fitted = np.zeros((ATLAS_HEIGHT, ATLAS_WIDTH, 4), dtype=np.uint8)
+            height = min(pixels.shape[0], ATLAS_HEIGHT)
+            width = min(pixels.shape[1], ATLAS_WIDTH)
+            fitted[:height, :width] = pixels[:height, :width]
+            pixels = fitted
+        atlas = cls(pixels)
+        if image.mode == "RGBA" and image.size == ATLAS_SIZE:
+            atlas._image = image
+        return atlas
+
+    @classmethod
+    def open(cls, path: Path) -> Atlas:
+        with Image.open(path) as opened:
+            return cls.from_image(opened.convert("RGBA"))
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            self._image = Image.fromarray(self.pixels, "RGBA")
+        return self._image
+
+    def cell(self, row: int, column: int) -> np.ndarray:
+        return self.cells[row, column]
+
+    def state_cells(self, state: str) -> np.ndarray:
+        return self.cells[STATE_ROWS[state], : ROW_FRAME_COUNTS[state]]
+
+    def alpha_counts(self) -> np.ndarray:
+        return np.count_nonzero(self.cells[..., 3], axis=(2, 3))
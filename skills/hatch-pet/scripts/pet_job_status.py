@@ -7,12 +7,7 @@ import argparse
 import json
 from pathlib import Path
 
-
-def load_manifest(run_dir: Path) -> dict[str, object]:
-    path = run_dir / "imagegen-jobs.json"
-    if not path.exists():
-        raise SystemExit(f"job manifest not found: {path}")
-    return json.loads(path.read_text(encoding="utf-8"))
+from job_manifest import load_manifest
 
 
 def jobs(manifest: dict[str, object]) -> list[dict[str, object]]:
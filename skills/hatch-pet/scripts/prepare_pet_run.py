@@ -11,6 +11,7 @@ import shutil
 from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 from PIL import ImageDraw
 
@@ -311,32 +312,27 @@ def rgb_to_hex(rgb: tuple[int, int, int]) -> str:
     return f"#{rgb[0]:02X}{rgb[1]:02X}{rgb[2]:02X}"
 
 
-def color_distance(left: tuple[int, int, int], right: tuple[int, int, int]) -> float:
-    return math.sqrt(sum((left[index] - right[index]) ** 2 for index in range(3)))
-
-
-def sampled_reference_pixels(paths: list[Path]) -> list[tuple[int, int, int]]:
-    pixels: list[tuple[int, int, int]] = []
+def sampled_reference_pixels(paths: list[Path], sample_size: int = 128) -> np.ndarray:
+    samples = []
     for path in paths:
         with Image.open(path) as opened:
             image = opened.convert("RGBA")
-            image.thumbnail((128, 128), Image.Resampling.LANCZOS)
-            data = image.tobytes()
-            for index in range(0, len(data), 4):
-                red, green, blue, alpha = data[index : index + 4]
-                if alpha <= 16:
-                    continue
-                pixels.append((red, green, blue))
-
-    non_background = [
-        pixel
-        for pixel in pixels
-        if not (pixel[0] > 244 and pixel[1] > 244 and pixel[2] > 244)
-    ]
-    return non_background or pixels
-
-
-def choose_chroma_key(reference_paths: list[Path], requested: str) -> dict[str, object]:
+            image.thumbnail((sample_size, sample_size), Image.Resampling.LANCZOS)
+            pixels = np.asarray(image).reshape(-1, 4)
+            samples.append(pixels[pixels[:, 3] > 16, :3])
+    if not samples:
+        return np.empty((0, 3), dtype=np.uint8)
+
+    pixels = np.concatenate(samples)
+    non_background = pixels[~np.all(pixels > 244, axis=1)]
+    return non_background if non_background.size else pixels
+
+
+def choose_chroma_key(
+    reference_paths: list[Path],
+    requested: str,
+    sample_size: int = 128,
+) -> dict[str, object]:
     if requested.lower() != "auto":
         rgb = parse_hex_color(requested)
         return {
@@ -346,8 +342,8 @@ def choose_chroma_key(reference_paths: list[Path], requested: str) -> dict[str,
             "selection": "manual",
         }
 
-    pixels = sampled_reference_pixels(reference_paths)
-    if not pixels:
+    pixels = sampled_reference_pixels(reference_paths, sample_size)
+    if not len(pixels):
         rgb = parse_hex_color("#FF00FF")
         return {
             "hex": "#FF00FF",
@@ -356,12 +352,21 @@ def choose_chroma_key(reference_paths: list[Path], requested: str) -> dict[str,
             "selection": "fallback",
         }
 
+    # Squared distances for every candidate at once; the 1st percentile only needs a partition.
+    candidates = np.array(
+        [parse_hex_color(hex_color) for _name, hex_color in CHROMA_KEY_CANDIDATES], dtype=np.int32
+    )
+    distances_sq = np.zeros((len(candidates), len(pixels)), dtype=np.int32)
+    for channel in range(3):
+        delta = candidates[:, channel, None] - pixels[None, :, channel].astype(np.int32)
+        distances_sq += delta * delta
+    percentile_index = max(0, min(len(pixels) - 1, int(len(pixels) * 0.01)))
+    percentiles = np.partition(distances_sq, percentile_index, axis=1)[:, percentile_index]
+
     scored: list[tuple[float, int, str, tuple[int, int, int]]] = []
     for preference_index, (name, hex_color) in enumerate(CHROMA_KEY_CANDIDATES):
-        rgb = parse_hex_color(hex_color)
-        distances = sorted(color_distance(rgb, pixel) for pixel in pixels)
-        percentile_index = max(0, min(len(distances) - 1, int(len(distances) * 0.01)))
-        scored.append((distances[percentile_index], -preference_index, name, rgb))
+        distance = math.sqrt(int(percentiles[preference_index]))
+        scored.append((distance, -preference_index, name, parse_hex_color(hex_color)))
 
     score, _preference, name, rgb = max(scored)
     return {
@@ -558,6 +563,12 @@ def main() -> None:
         default="auto",
         help="Chroma key as #RRGGBB, or auto to choose a safe key from reference colors.",
     )
+    parser.add_argument(
+        "--chroma-sample-size",
+        type=int,
+        default=128,
+        help="Thumbnail size used to sample reference colors for automatic chroma key selection.",
+    )
     parser.add_argument("--force", action="store_true")
     args = parser.parse_args()
 
@@ -610,7 +621,7 @@ def main() -> None:
         copied_refs.append(meta)
         copied_ref_paths.append(copied)
 
-    args.chroma_key = choose_chroma_key(copied_ref_paths, args.chroma_key)
+    args.chroma_key = choose_chroma_key(copied_ref_paths, args.chroma_key, args.chroma_sample_size)
     layout_guides = create_layout_guides(run_dir)
 
     request = {
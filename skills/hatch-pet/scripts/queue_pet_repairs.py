@@ -9,6 +9,8 @@ import shutil
 from datetime import datetime, timezone
 from pathlib import Path
 
+from job_manifest import job_list, update_manifest
+
 
 def load_json(path: Path) -> dict[str, object]:
     if not path.exists():
@@ -60,13 +62,6 @@ Repair attempt {attempt}:
     prompt_path.write_text(existing.rstrip() + note.rstrip() + "\n", encoding="utf-8")
 
 
-def job_list(manifest: dict[str, object]) -> list[dict[str, object]]:
-    jobs = manifest.get("jobs")
-    if not isinstance(jobs, list):
-        raise SystemExit("invalid imagegen-jobs.json: jobs must be a list")
-    return [job for job in jobs if isinstance(job, dict)]
-
-
 def next_archive_path(archive_dir: Path, state: str, attempt: int, suffix: str) -> Path:
     candidate = archive_dir / f"{state}-attempt-{attempt}-previous{suffix}"
     if not candidate.exists():
@@ -150,21 +145,22 @@ def main() -> None:
         if args.review
         else run_dir / "qa" / "review.json"
     )
-    manifest_path = run_dir / "imagegen-jobs.json"
     review = load_json(review_path)
-    manifest = load_json(manifest_path)
 
     repairs = rows_to_repair(review, repair_on_warnings=args.repair_on_warnings)
-    queued: list[dict[str, object]] = []
-    for repair in repairs:
-        state = str(repair["state"])
-        reason = str(repair["reason"])
-        queued_repair = queue_repair(manifest, run_dir, state, reason)
-        attempt = int(queued_repair["attempt"])
-        append_repair_note(run_dir, state, attempt, reason)
-        queued.append({"state": state, "reason": reason, **queued_repair})
-
-    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    def queue_all(manifest: dict[str, object]) -> list[dict[str, object]]:
+        queued: list[dict[str, object]] = []
+        for repair in repairs:
+            state = str(repair["state"])
+            reason = str(repair["reason"])
+            queued_repair = queue_repair(manifest, run_dir, state, reason)
+            attempt = int(queued_repair["attempt"])
+            append_repair_note(run_dir, state, attempt, reason)
+            queued.append({"state": state, "reason": reason, **queued_repair})
+        return queued
+
+    queued = update_manifest(run_dir, queue_all)
     print(json.dumps({"ok": True, "queued": queued}, indent=2))
 
 
@@ -4,7 +4,6 @@
 from __future__ import annotations
 
 import argparse
-import hashlib
 import json
 import os
 import shutil
@@ -13,27 +12,10 @@ from pathlib import Path
 
 from PIL import Image
 
-CANONICAL_BASE_PATH = "references/canonical-base.png"
-
-
-def load_jobs(path: Path) -> dict[str, object]:
-    if not path.exists():
-        raise SystemExit(f"job manifest not found: {path}")
-    return json.loads(path.read_text(encoding="utf-8"))
-
+from hash_cache import HashCache
+from job_manifest import find_job, job_list, load_manifest, update_job
 
-def job_list(manifest: dict[str, object]) -> list[dict[str, object]]:
-    jobs = manifest.get("jobs")
-    if not isinstance(jobs, list):
-        raise SystemExit("invalid imagegen-jobs.json: jobs must be a list")
-    return [job for job in jobs if isinstance(job, dict)]
-
-
-def find_job(manifest: dict[str, object], job_id: str) -> dict[str, object]:
-    for job in job_list(manifest):
-        if job.get("id") == job_id:
-            return job
-    raise SystemExit(f"unknown job id: {job_id}")
+CANONICAL_BASE_PATH = "references/canonical-base.png"
 
 
 def image_metadata(path: Path) -> dict[str, object]:
@@ -48,14 +30,6 @@ def image_metadata(path: Path) -> dict[str, object]:
         }
 
 
-def file_sha256(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as file:
-        for chunk in iter(lambda: file.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
-
-
 def manifest_relative(path: Path, run_dir: Path) -> str:
     return str(path.resolve().relative_to(run_dir.resolve()))
 
@@ -104,6 +78,18 @@ def validate_source_path(
     return "built-in-imagegen"
 
 
+def ensure_ready(manifest: dict[str, object], job: dict[str, object], job_id: str) -> None:
+    missing_deps = [
+        dep
+        for dep in job.get("depends_on", [])
+        if isinstance(dep, str) and dep not in completed_job_ids(manifest)
+    ]
+    if missing_deps:
+        raise SystemExit(
+            f"job {job_id} is not ready; missing dependency result(s): {', '.join(missing_deps)}"
+        )
+
+
 def validate_required_grounding(job: dict[str, object], run_dir: Path) -> None:
     if job.get("allow_prompt_only_generation") is not False:
         return
@@ -133,6 +119,7 @@ def update_base_canonical_reference(
     manifest: dict[str, object],
     job: dict[str, object],
     metadata: dict[str, object],
+    output_sha256: str,
 ) -> None:
     if job.get("id") != "base":
         return
@@ -140,11 +127,10 @@ def update_base_canonical_reference(
     canonical = run_dir / CANONICAL_BASE_PATH
     canonical.parent.mkdir(parents=True, exist_ok=True)
     shutil.copy2(output, canonical)
-    canonical_sha = file_sha256(canonical)
     reference = {
         "path": manifest_relative(canonical, run_dir),
         "source_job": "base",
-        "sha256": canonical_sha,
+        "sha256": output_sha256,
         "metadata": metadata,
     }
     job["canonical_reference_path"] = reference["path"]
@@ -178,19 +164,9 @@ def main() -> None:
         allow_synthetic_test_source=args.allow_synthetic_test_source,
     )
 
-    manifest_path = run_dir / "imagegen-jobs.json"
-    manifest = load_jobs(manifest_path)
+    manifest = load_manifest(run_dir)
     job = find_job(manifest, args.job_id)
-
-    missing_deps = [
-        dep
-        for dep in job.get("depends_on", [])
-        if isinstance(dep, str) and dep not in completed_job_ids(manifest)
-    ]
-    if missing_deps:
-        raise SystemExit(
-            f"job {args.job_id} is not ready; missing dependency result(s): {', '.join(missing_deps)}"
-        )
+    ensure_ready(manifest, job, args.job_id)
     validate_required_grounding(job, run_dir)
 
     output_raw = job.get("output_path")
@@ -203,36 +179,43 @@ def main() -> None:
     output.parent.mkdir(parents=True, exist_ok=True)
     shutil.copy2(source, output)
     metadata = image_metadata(output)
+    hashes = HashCache(run_dir)
+    source_sha256 = hashes.sha256(source)
+    output_sha256 = hashes.sha256(output)
+
+    def record(job: dict[str, object], manifest: dict[str, object]) -> None:
+        ensure_ready(manifest, job, args.job_id)
+        job["status"] = "complete"
+        job["source_path"] = str(source)
+        job["source_provenance"] = source_provenance
+        job["source_sha256"] = source_sha256
+        job["output_sha256"] = output_sha256
+        if source_provenance == "synthetic-test":
+            job["synthetic_test_source"] = True
+        else:
+            job.pop("synthetic_test_source", None)
+        job["completed_at"] = datetime.now(timezone.utc).isoformat()
+        job["metadata"] = metadata
+        for key in [
+            "last_error",
+            "secondary_fallback",
+            "derived_from",
+            "mirror_decision",
+            "repair_reason",
+            "queued_at",
+        ]:
+            job.pop(key, None)
+        update_base_canonical_reference(
+            run_dir=run_dir,
+            output=output,
+            manifest=manifest,
+            job=job,
+            metadata=metadata,
+            output_sha256=output_sha256,
+        )
 
-    job["status"] = "complete"
-    job["source_path"] = str(source)
-    job["source_provenance"] = source_provenance
-    job["source_sha256"] = file_sha256(source)
-    job["output_sha256"] = file_sha256(output)
-    if source_provenance == "synthetic-test":
-        job["synthetic_test_source"] = True
-    else:
-        job.pop("synthetic_test_source", None)
-    job["completed_at"] = datetime.now(timezone.utc).isoformat()
-    job["metadata"] = metadata
-    for key in [
-        "last_error",
-        "secondary_fallback",
-        "derived_from",
-        "mirror_decision",
-        "repair_reason",
-        "queued_at",
-    ]:
-        job.pop(key, None)
-    update_base_canonical_reference(
-        run_dir=run_dir,
-        output=output,
-        manifest=manifest,
-        job=job,
-        metadata=metadata,
-    )
-
-    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    update_job(run_dir, args.job_id, record)
+    hashes.save()
     print(
         json.dumps(
             {
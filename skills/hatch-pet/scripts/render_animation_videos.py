@@ -4,44 +4,54 @@
 from __future__ import annotations
 
 import argparse
+import math
+import os
 import shutil
 import subprocess
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from PIL import Image, ImageDraw
-
-CELL_WIDTH = 192
-CELL_HEIGHT = 208
-STATES = {
-    "idle": (0, [280, 110, 110, 140, 140, 320]),
-    "running-right": (1, [120, 120, 120, 120, 120, 120, 120, 220]),
-    "running-left": (2, [120, 120, 120, 120, 120, 120, 120, 220]),
-    "waving": (3, [140, 140, 140, 280]),
-    "jumping": (4, [140, 140, 140, 140, 280]),
-    "failed": (5, [140, 140, 140, 140, 140, 140, 140, 240]),
-    "waiting": (6, [150, 150, 150, 150, 150, 260]),
-    "running": (7, [120, 120, 120, 120, 120, 220]),
-    "review": (8, [150, 150, 150, 150, 150, 280]),
+from PIL import Image
+
+from pet_atlas import CELL_HEIGHT, CELL_WIDTH, STATE_ROWS, Atlas, over_checker
+
+DEFAULT_FPS = 25
+FRAME_DURATIONS = {
+    "idle": [280, 110, 110, 140, 140, 320],
+    "running-right": [120, 120, 120, 120, 120, 120, 120, 220],
+    "running-left": [120, 120, 120, 120, 120, 120, 120, 220],
+    "waving": [140, 140, 140, 280],
+    "jumping": [140, 140, 140, 140, 280],
+    "failed": [140, 140, 140, 140, 140, 140, 140, 240],
+    "waiting": [150, 150, 150, 150, 150, 260],
+    "running": [120, 120, 120, 120, 120, 220],
+    "review": [150, 150, 150, 150, 150, 280],
 }
 
 
-def checker(size: tuple[int, int], square: int = 16) -> Image.Image:
-    image = Image.new("RGB", size, "#ffffff")
-    draw = ImageDraw.Draw(image)
-    for y in range(0, size[1], square):
-        for x in range(0, size[0], square):
-            if (x // square + y // square) % 2:
-                draw.rectangle((x, y, x + square - 1, y + square - 1), fill="#e8e8e8")
-    return image
+def frame_rate_for(durations: list[int]) -> int:
+    return 1000 // math.gcd(*durations)
 
 
-def shell_quote_for_concat(path: Path) -> str:
-    return "'" + str(path).replace("'", "'\\''") + "'"
+def frame_repeats(durations: list[int], fps: int) -> list[int]:
+    # Round cumulative timestamps so tick errors never accumulate across frames.
+    repeats = []
+    elapsed_ms = 0
+    emitted = 0
+    for duration_ms in durations:
+        elapsed_ms += duration_ms
+        ticks = round(elapsed_ms * fps / 1000)
+        repeats.append(ticks - emitted)
+        emitted = ticks
+    return repeats
+
+
+def state_frames(atlas: Atlas, row: int, frame_count: int) -> list[bytes]:
+    return [over_checker(atlas.cell(row, column)).tobytes() for column in range(frame_count)]
 
 
 def render_state(
-    atlas: Image.Image,
+    atlas: Atlas,
     state: str,
     row: int,
     durations: list[int],
@@ -49,56 +59,74 @@ def render_state(
     loops: int,
     scale: int,
     ffmpeg: str,
+    fps: int = DEFAULT_FPS,
+) -> None:
+    fps = fps or frame_rate_for(durations)
+    frames = state_frames(atlas, row, len(durations))
+    repeats = frame_repeats(durations * loops, fps)
+
+    output = output_dir / f"{state}.mp4"
+    command = [
+        ffmpeg,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "-video_size",
+        f"{CELL_WIDTH}x{CELL_HEIGHT}",
+        "-framerate",
+        str(fps),
+        "-i",
+        "-",
+        "-vf",
+        f"scale={CELL_WIDTH * scale}:{CELL_HEIGHT * scale}:flags=lanczos,format=yuv420p",
+        "-movflags",
+        "+faststart",
+        str(output),
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for frame, count in zip(frames * loops, repeats, strict=True):
+            for _ in range(count):
+                process.stdin.write(frame)
+    except BrokenPipeError:
+        pass
+    finally:
+        process.stdin.close()
+    returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def render_videos(
+    atlas: Image.Image | Atlas,
+    output_dir: Path,
+    loops: int = 4,
+    scale: int = 2,
+    ffmpeg: str = "ffmpeg",
+    jobs: int = 1,
+    fps: int = DEFAULT_FPS,
 ) -> None:
-    with tempfile.TemporaryDirectory(prefix=f"codex-pet-{state}-") as temp_raw:
-        temp = Path(temp_raw)
-        frame_paths: list[Path] = []
-        for column in range(len(durations)):
-            crop = atlas.crop(
-                (
-                    column * CELL_WIDTH,
-                    row * CELL_HEIGHT,
-                    (column + 1) * CELL_WIDTH,
-                    (row + 1) * CELL_HEIGHT,
-                )
-            ).convert("RGBA")
-            bg = checker((CELL_WIDTH, CELL_HEIGHT))
-            bg.paste(crop, (0, 0), crop)
-            frame_path = temp / f"{state}-{column:02d}.png"
-            bg.save(frame_path)
-            frame_paths.append(frame_path)
-
-        concat_path = temp / f"{state}.ffconcat"
-        lines = ["ffconcat version 1.0"]
-        sequence: list[tuple[Path, int]] = []
-        for _ in range(loops):
-            sequence.extend(zip(frame_paths, durations, strict=True))
-        for frame_path, duration_ms in sequence:
-            lines.append(f"file {shell_quote_for_concat(frame_path)}")
-            lines.append(f"duration {duration_ms / 1000:.3f}")
-        lines.append(f"file {shell_quote_for_concat(sequence[-1][0])}")
-        concat_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
-
-        output = output_dir / f"{state}.mp4"
-        command = [
-            ffmpeg,
-            "-y",
-            "-hide_banner",
-            "-loglevel",
-            "error",
-            "-f",
-            "concat",
-            "-safe",
-            "0",
-            "-i",
-            str(concat_path),
-            "-vf",
-            f"scale={CELL_WIDTH * scale}:{CELL_HEIGHT * scale}:flags=lanczos,format=yuv420p",
-            "-movflags",
-            "+faststart",
-            str(output),
-        ]
-        subprocess.run(command, check=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not isinstance(atlas, Atlas):
+        atlas = Atlas.from_image(atlas)
+    tasks = [
+        (atlas, state, STATE_ROWS[state], durations, output_dir, loops, scale, ffmpeg, fps)
+        for state, durations in FRAME_DURATIONS.items()
+    ]
+    workers = max(1, min(jobs if jobs > 0 else os.cpu_count() or 1, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            render_state(*task)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_state, *task) for task in tasks]
+        for future in futures:
+            future.result()
 
 
 def main() -> None:
@@ -108,25 +136,24 @@ def main() -> None:
     parser.add_argument("--loops", type=int, default=4)
     parser.add_argument("--scale", type=int, default=2)
     parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg")
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=DEFAULT_FPS,
+        help="Output frame rate; 0 picks one that represents every frame duration exactly.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Render this many states concurrently; 0 uses one per CPU.",
+    )
     args = parser.parse_args()
 
     output_dir = Path(args.output_dir).expanduser().resolve()
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    with Image.open(Path(args.atlas).expanduser().resolve()) as opened:
-        atlas = opened.convert("RGBA")
-
-    for state, (row, durations) in STATES.items():
-        render_state(
-            atlas,
-            state,
-            row,
-            durations,
-            output_dir,
-            args.loops,
-            args.scale,
-            args.ffmpeg,
-        )
+    atlas = Atlas.open(Path(args.atlas).expanduser().resolve())
+    render_videos(atlas, output_dir, args.loops, args.scale, args.ffmpeg, args.jobs, args.fps)
     print(f"wrote videos to {output_dir}")
 
 
@@ -10,88 +10,69 @@ from pathlib import Path
 
 from PIL import Image
 
-COLUMNS = 8
-ROWS = 9
-CELL_WIDTH = 192
-CELL_HEIGHT = 208
-ATLAS_WIDTH = COLUMNS * CELL_WIDTH
-ATLAS_HEIGHT = ROWS * CELL_HEIGHT
-ROW_BY_INDEX = {
-    0: ("idle", 6),
-    1: ("running-right", 8),
-    2: ("running-left", 8),
-    3: ("waving", 4),
-    4: ("jumping", 5),
-    5: ("failed", 8),
-    6: ("waiting", 6),
-    7: ("running", 6),
-    8: ("review", 6),
-}
-
-
-def alpha_nonzero_count(image: Image.Image) -> int:
-    alpha = image.getchannel("A")
-    return sum(alpha.histogram()[1:])
-
-
-def main() -> None:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("atlas")
-    parser.add_argument("--json-out")
-    parser.add_argument("--min-used-pixels", type=int, default=50)
-    parser.add_argument("--near-opaque-threshold", type=float, default=0.95)
-    parser.add_argument("--allow-opaque", action="store_true")
-    parser.add_argument("--allow-near-opaque-used-cells", action="store_true")
-    args = parser.parse_args()
-
-    atlas_path = Path(args.atlas).expanduser().resolve()
+from pet_atlas import (
+    ATLAS_HEIGHT,
+    ATLAS_SIZE,
+    ATLAS_WIDTH,
+    CELL_HEIGHT,
+    CELL_WIDTH,
+    COLUMNS,
+    ROW_SPECS,
+    USED_COLUMNS,
+    Atlas,
+)
+
+
+def validate_atlas_image(
+    image: Image.Image,
+    *,
+    source_format: str | None,
+    source_mode: str,
+    file: str | None = None,
+    min_used_pixels: int = 50,
+    near_opaque_threshold: float = 0.95,
+    allow_opaque: bool = False,
+    allow_near_opaque_used_cells: bool = False,
+) -> dict[str, object]:
+    atlas = Atlas.from_image(image, fit=True)
     errors: list[str] = []
     warnings: list[str] = []
     near_opaque_used_cells: dict[str, list[int]] = defaultdict(list)
     cells: list[dict[str, object]] = []
 
-    try:
-        with Image.open(atlas_path) as opened:
-            source_mode = opened.mode
-            source_format = opened.format
-            image = opened.convert("RGBA")
-    except Exception as exc:  # noqa: BLE001
-        result = {"ok": False, "errors": [f"could not open atlas: {exc}"], "warnings": []}
-        print(json.dumps(result, indent=2))
-        raise SystemExit(1)
-
-    if image.size != (ATLAS_WIDTH, ATLAS_HEIGHT):
+    if image.size != ATLAS_SIZE:
         errors.append(f"expected {ATLAS_WIDTH}x{ATLAS_HEIGHT}, got {image.width}x{image.height}")
 
     if source_format not in {"PNG", "WEBP"}:
         errors.append(f"expected PNG or WebP, got {source_format}")
 
-    if "A" not in source_mode and not args.allow_opaque:
+    if "A" not in source_mode and not allow_opaque:
         errors.append("atlas does not have an alpha channel")
 
-    for row_index in range(ROWS):
-        state, frame_count = ROW_BY_INDEX[row_index]
+    counts = atlas.alpha_counts()
+    sparse = USED_COLUMNS & (counts < min_used_pixels)
+    near_opaque = USED_COLUMNS & (counts > CELL_WIDTH * CELL_HEIGHT * near_opaque_threshold)
+    leaking = ~USED_COLUMNS & (counts != 0)
+
+    for state, row_index, _frame_count in ROW_SPECS:
         for column_index in range(COLUMNS):
-            left = column_index * CELL_WIDTH
-            top = row_index * CELL_HEIGHT
-            cell = image.crop((left, top, left + CELL_WIDTH, top + CELL_HEIGHT))
-            nontransparent = alpha_nonzero_count(cell)
-            used = column_index < frame_count
-            cell_info = {
-                "state": state,
-                "row": row_index,
-                "column": column_index,
-                "used": used,
-                "nontransparent_pixels": nontransparent,
-            }
-            cells.append(cell_info)
-            if used and nontransparent < args.min_used_pixels:
+            nontransparent = int(counts[row_index, column_index])
+            cells.append(
+                {
+                    "state": state,
+                    "row": row_index,
+                    "column": column_index,
+                    "used": bool(USED_COLUMNS[row_index, column_index]),
+                    "nontransparent_pixels": nontransparent,
+                }
+            )
+            if sparse[row_index, column_index]:
                 errors.append(
                     f"{state} row {row_index} column {column_index} is empty or too sparse ({nontransparent} pixels)"
                 )
-            if used and nontransparent > CELL_WIDTH * CELL_HEIGHT * args.near_opaque_threshold:
+            if near_opaque[row_index, column_index]:
                 near_opaque_used_cells[f"{state} row {row_index}"].append(column_index)
-            if not used and nontransparent != 0:
+            if leaking[row_index, column_index]:
                 errors.append(
                     f"{state} row {row_index} unused column {column_index} is not transparent ({nontransparent} pixels)"
                 )
@@ -101,22 +82,21 @@ def main() -> None:
             f"{row_label} has {len(columns)} nearly opaque used cells; "
             "this usually means the sprite has a non-transparent background"
         )
-        if args.allow_near_opaque_used_cells:
+        if allow_near_opaque_used_cells:
             warnings.append(message)
         else:
             errors.append(message)
 
-    alpha_count = alpha_nonzero_count(image)
-    if alpha_count == ATLAS_WIDTH * ATLAS_HEIGHT:
+    if image.size == ATLAS_SIZE and int(counts.sum()) == ATLAS_WIDTH * ATLAS_HEIGHT:
         message = "atlas is fully opaque; custom pets require a transparent sprite background"
-        if args.allow_opaque:
+        if allow_opaque:
             warnings.append(message)
         else:
             errors.append(message)
 
-    result = {
+    return {
         "ok": not errors,
-        "file": str(atlas_path),
+        "file": file,
         "format": source_format,
         "mode": source_mode,
         "width": image.width,
@@ -126,10 +106,46 @@ def main() -> None:
         "cells": cells,
     }
 
+
+def write_result(result: dict[str, object], json_out: Path) -> None:
+    json_out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("atlas")
+    parser.add_argument("--json-out")
+    parser.add_argument("--min-used-pixels", type=int, default=50)
+    parser.add_argument("--near-opaque-threshold", type=float, default=0.95)
+    parser.add_argument("--allow-opaque", action="store_true")
+    parser.add_argument("--allow-near-opaque-used-cells", action="store_true")
+    args = parser.parse_args()
+
+    atlas_path = Path(args.atlas).expanduser().resolve()
+
+    try:
+        with Image.open(atlas_path) as opened:
+            source_mode = opened.mode
+            source_format = opened.format
+            image = opened.convert("RGBA")
+    except Exception as exc:  # noqa: BLE001
+        result = {"ok": False, "errors": [f"could not open atlas: {exc}"], "warnings": []}
+        print(json.dumps(result, indent=2))
+        raise SystemExit(1)
+
+    result = validate_atlas_image(
+        image,
+        source_format=source_format,
+        source_mode=source_mode,
+        file=str(atlas_path),
+        min_used_pixels=args.min_used_pixels,
+        near_opaque_threshold=args.near_opaque_threshold,
+        allow_opaque=args.allow_opaque,
+        allow_near_opaque_used_cells=args.allow_near_opaque_used_cells,
+    )
+
     if args.json_out:
-        Path(args.json_out).expanduser().resolve().write_text(
-            json.dumps(result, indent=2) + "\n", encoding="utf-8"
-        )
+        write_result(result, Path(args.json_out).expanduser().resolve())
 
     print(json.dumps({k: v for k, v in result.items() if k != "cells"}, indent=2))
     raise SystemExit(0 if result["ok"] else 1)
@@ -1,10 +1,37 @@
 #!/usr/bin/env python3
+import fcntl
+import hashlib
 import json
 import os
+import tempfile
+import threading
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
 DEFAULT_TIMEOUT_SECONDS = 20.0
+USER_LOOKUP_WORKERS = 12
+USERS_LIST_THRESHOLD = 100
+USER_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Requests per minute for Slack's Web API rate limit tiers.
+TIER_LIMITS = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "chat.postMessage": 4,
+    "conversations.history": 3,
+    "conversations.info": 3,
+    "conversations.mark": 3,
+    "conversations.replies": 3,
+    "users.conversations": 2,
+    "users.info": 4,
+    "users.list": 2,
+}
+DEFAULT_TIER = 3
+MAX_IN_FLIGHT_PER_METHOD = 12
+RATE_LIMIT_RETRIES = 5
+DEFAULT_RETRY_AFTER_SECONDS = 30.0
 
 
 def get_token(env_key: str = "SLACK_USER_TOKEN") -> str:
@@ -18,7 +45,127 @@ def get_timeout() -> float:
     return DEFAULT_TIMEOUT_SECONDS
 
 
-def api_call(method: str, token: str, params=None, timeout: Optional[float] = None) -> dict:
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited; retry after {retry_after:g}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows one minute's worth of requests as a burst, then refills at the tier rate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, float(per_minute))
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AdaptiveLimit:
+    """In-flight cap that halves on every rate limit and grows back by one per clean window."""
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self.limit = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def success(self) -> None:
+        with self.condition:
+            self.successes += 1
+            if self.limit < self.maximum and self.successes >= self.limit:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+    def throttled(self) -> None:
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+
+class RequestScheduler:
+    def __init__(self, proactive: bool = False, max_in_flight: int = MAX_IN_FLIGHT_PER_METHOD):
+        self.proactive = proactive
+        self.max_in_flight = max_in_flight
+        self.buckets = {}
+        self.limits = {}
+        self.blocked_until = {}
+        self.lock = threading.Lock()
+
+    def _state(self, method: str):
+        with self.lock:
+            if method not in self.limits:
+                tier = METHOD_TIERS.get(method, DEFAULT_TIER)
+                self.buckets[method] = TokenBucket(TIER_LIMITS[tier])
+                self.limits[method] = AdaptiveLimit(self.max_in_flight)
+            return self.buckets[method], self.limits[method]
+
+    def call(self, method: str, request):
+        bucket, limit = self._state(method)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            with limit:
+                delay = self.blocked_until.get(method, 0.0) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if self.proactive:
+                    delay = bucket.take()
+                    if delay > 0:
+                        time.sleep(delay)
+                try:
+                    result = request()
+                except RateLimited as exc:
+                    limit.throttled()
+                    with self.lock:
+                        self.blocked_until[method] = max(
+                            self.blocked_until.get(method, 0.0), time.monotonic() + exc.retry_after
+                        )
+                    if attempt == RATE_LIMIT_RETRIES:
+                        raise SystemExit(f"Slack API error: ratelimited ({method})")
+                    continue
+            limit.success()
+            return result
+
+
+def _proactive_rate_limits() -> bool:
+    # Off by default: the tier minimums are far below what most workspaces allow,
+    # so pacing to them slows sweeps Slack would never have throttled.
+    return os.getenv("SLACK_PROACTIVE_RATE_LIMIT", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+_scheduler = RequestScheduler(proactive=_proactive_rate_limits())
+
+
+def _retry_after(headers) -> float:
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+def _send(method: str, token: str, params, timeout: Optional[float]) -> dict:
     url = f"https://slack.com/api/{method}"
     data = urllib.parse.urlencode(params or {}).encode("utf-8")
     req = urllib.request.Request(url, data=data)
@@ -27,6 +174,11 @@ def api_call(method: str, token: str, params=None, timeout: Optional[float] = No
     try:
         with urllib.request.urlopen(req, timeout=timeout or get_timeout()) as resp:
             raw = resp.read().decode("utf-8")
+            headers = resp.headers
+    except urllib.error.HTTPError as exc:
+        if exc.code == 429:
+            raise RateLimited(_retry_after(exc.headers))
+        raise SystemExit(f"Slack API request failed: {exc}")
     except Exception as exc:
         raise SystemExit(f"Slack API request failed: {exc}")
 
@@ -37,10 +189,16 @@ def api_call(method: str, token: str, params=None, timeout: Optional[float] = No
 
     if not payload.get("ok"):
         err = payload.get("error") or "unknown_error"
+        if err == "ratelimited":
+            raise RateLimited(_retry_after(headers))
         raise SystemExit(f"Slack API error: {err}")
     return payload
 
 
+def api_call(method: str, token: str, params=None, timeout: Optional[float] = None) -> dict:
+    return _scheduler.call(method, lambda: _send(method, token, params, timeout))
+
+
 def paginate(method: str, token: str, params: dict, list_key: str) -> list:
     items = []
     cursor = None
@@ -72,12 +230,151 @@ def resolve_user_name(token: str, user_id: str, cache: dict) -> str:
         return ""
     if user_id in cache:
         return cache[user_id]
-    payload = api_call("users.info", token, {"user": user_id})
-    name = user_display_name(payload.get("user", {}))
+    name = _fetch_user_name(token, user_id)
     cache[user_id] = name
     return name
 
 
+def get_cache_dir() -> Path:
+    override = os.getenv("SLACK_CACHE_DIR", "").strip()
+    if override:
+        return Path(override).expanduser()
+    return Path(os.getenv("XDG_CACHE_HOME") or "~/.cache").expanduser() / "slack"
+
+
+def get_user_cache_ttl() -> float:
+    raw = os.getenv("SLACK_USER_CACHE_TTL", "").strip()
+    try:
+        return float(raw) if raw else USER_CACHE_TTL_SECONDS
+    except ValueError:
+        raise SystemExit(f"Invalid SLACK_USER_CACHE_TTL: {raw}")
+
+
+def write_json_atomic(path: Path, payload, indent: Optional[int] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def workspace_cache_path(token: str, prefix: str) -> Path:
+    # One file per token so different workspaces never share ids.
+    workspace = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+    return get_cache_dir() / f"{prefix}-{workspace}.json"
+
+
+class UserDirectory:
+    """Persistent user id -> display name map with a per-entry TTL.
+
+    Writers merge under an advisory lock and replace the file atomically, so
+    concurrent scripts can read it at any time and never see a partial write.
+    The TTL only applies to entries loaded from disk; names fetched by this
+    process stay usable for its lifetime, even with a TTL of 0.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._entries = self._read()
+        self._changed = {}
+        self._fetched = set()
+
+    def _read(self) -> dict:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        users = payload.get("users") if isinstance(payload, dict) else None
+        if not isinstance(users, dict):
+            return {}
+        return {
+            user_id: entry
+            for user_id, entry in users.items()
+            if isinstance(entry, dict) and isinstance(entry.get("name"), str)
+        }
+
+    def _fresh(self, entry: dict) -> bool:
+        fetched_at = entry.get("fetched_at")
+        return isinstance(fetched_at, (int, float)) and time.time() - fetched_at < self.ttl_seconds
+
+    def __contains__(self, user_id) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and (user_id in self._fetched or self._fresh(entry))
+
+    def __getitem__(self, user_id) -> str:
+        return self._entries[user_id]["name"]
+
+    def __setitem__(self, user_id, name: str) -> None:
+        entry = {"name": name, "fetched_at": time.time()}
+        self._entries[user_id] = entry
+        self._changed[user_id] = entry
+        self._fetched.add(user_id)
+
+    def get(self, user_id, default=None):
+        return self[user_id] if user_id in self else default
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._read()
+            for user_id, entry in self._changed.items():
+                current = entries.get(user_id)
+                if current is None or current.get("fetched_at", 0) <= entry["fetched_at"]:
+                    entries[user_id] = entry
+            write_json_atomic(self.path, {"users": entries})
+        self._entries.update(entries)
+        self._changed = {}
+
+
+def load_user_cache(token: str) -> UserDirectory:
+    return UserDirectory(workspace_cache_path(token, "users"), get_user_cache_ttl())
+
+
+def warm_user_cache(token: str, cache) -> dict:
+    names = {}
+    for user in paginate("users.list", token, {"limit": 200}, "members"):
+        if user.get("id"):
+            names[user["id"]] = cache[user["id"]] = user_display_name(user)
+    return names
+
+
+def _fetch_user_name(token: str, user_id: str) -> str:
+    payload = api_call("users.info", token, {"user": user_id})
+    return user_display_name(payload.get("user", {}))
+
+
+def resolve_user_names(
+    token: str,
+    user_ids: Iterable[str],
+    cache: dict,
+    workers: int = USER_LOOKUP_WORKERS,
+    list_threshold: int = USERS_LIST_THRESHOLD,
+) -> dict:
+    # One users.list sweep beats hundreds of users.info calls; whatever it misses
+    # (e.g. external users in shared channels) is looked up concurrently.
+    wanted = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+    names = {user_id: cache[user_id] for user_id in wanted if user_id in cache}
+    missing = [user_id for user_id in wanted if user_id not in names]
+    if len(missing) >= list_threshold:
+        listed = warm_user_cache(token, cache)
+        names.update((user_id, listed[user_id]) for user_id in missing if user_id in listed)
+        missing = [user_id for user_id in missing if user_id not in names]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            fetched = executor.map(lambda user_id: _fetch_user_name(token, user_id), missing)
+            for user_id, name in zip(missing, fetched):
+                names[user_id] = cache[user_id] = name
+    return {user_id: names[user_id] for user_id in wanted}
+
+
 def conversation_display_name(conv: dict, token: str, user_cache: dict) -> str:
     if conv.get("is_im"):
         user_id = conv.get("user")
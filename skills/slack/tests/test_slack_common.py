@@ -0,0 +1,170 @@
+import pathlib
+import sys
+import io
+import json
+import tempfile
+import unittest
+import urllib.error
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import slack_common  # noqa: E402
+
+
+def _user(user_id, display_name):
+    return {"id": user_id, "profile": {"display_name": display_name}}
+
+
+class ResolveUserNamesTests(unittest.TestCase):
+    def test_looks_up_only_uncached_users_with_users_info(self):
+        calls = []
+
+        def fake_api_call(method, token, params=None, timeout=None):
+            calls.append((method, params))
+            return {"ok": True, "user": _user(params["user"], f"name-{params['user']}")}
+
+        cache = {"U1": "cached"}
+        with mock.patch.object(slack_common, "api_call", side_effect=fake_api_call):
+            names = slack_common.resolve_user_names("token", ["U1", "U2", "U3", "U2", ""], cache)
+
+        self.assertEqual(names, {"U1": "cached", "U2": "name-U2", "U3": "name-U3"})
+        self.assertEqual(sorted(params["user"] for _method, params in calls), ["U2", "U3"])
+        self.assertTrue(all(method == "users.info" for method, _params in calls))
+
+    def test_large_sets_use_one_users_list_sweep_and_fall_back_for_the_rest(self):
+        calls = []
+
+        def fake_api_call(method, token, params=None, timeout=None):
+            calls.append(method)
+            if method == "users.list":
+                return {"ok": True, "members": [_user("U1", "one"), _user("U2", "two")]}
+            return {"ok": True, "user": _user(params["user"], "external")}
+
+        cache = {}
+        with mock.patch.object(slack_common, "api_call", side_effect=fake_api_call):
+            names = slack_common.resolve_user_names(
+                "token", ["U1", "U2", "X9"], cache, list_threshold=2
+            )
+
+        self.assertEqual(names, {"U1": "one", "U2": "two", "X9": "external"})
+        self.assertEqual(calls, ["users.list", "users.info"])
+
+    def test_zero_ttl_fetches_every_run_but_reuses_names_within_the_run(self):
+        calls = []
+
+        def fake_api_call(method, token, params=None, timeout=None):
+            calls.append(params["user"])
+            return {"ok": True, "user": _user(params["user"], f"name-{params['user']}")}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "users.json"
+            cache = slack_common.UserDirectory(path, ttl_seconds=0)
+            with mock.patch.object(slack_common, "api_call", side_effect=fake_api_call):
+                names = slack_common.resolve_user_names("token", ["U1"], cache)
+                cache.save()
+                name = slack_common.resolve_user_name("token", "U1", cache)
+                self.assertEqual(calls, ["U1"])
+
+                reloaded = slack_common.UserDirectory(path, ttl_seconds=0)
+                self.assertNotIn("U1", reloaded)
+                slack_common.resolve_user_names("token", ["U1"], reloaded)
+
+        self.assertEqual((names, name), ({"U1": "name-U1"}, "name-U1"))
+        self.assertEqual(calls, ["U1", "U1"])
+
+
+class UserDirectoryTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = pathlib.Path(tmp.name) / "users.json"
+
+    def test_entries_persist_until_their_ttl_expires(self):
+        with mock.patch.object(slack_common.time, "time", return_value=1_000.0):
+            cache = slack_common.UserDirectory(self.path, ttl_seconds=60)
+            cache["U1"] = "Ana"
+            cache.save()
+
+        with mock.patch.object(slack_common.time, "time", return_value=1_030.0):
+            reloaded = slack_common.UserDirectory(self.path, ttl_seconds=60)
+            self.assertIn("U1", reloaded)
+            self.assertEqual(reloaded["U1"], "Ana")
+
+        with mock.patch.object(slack_common.time, "time", return_value=1_061.0):
+            self.assertNotIn("U1", slack_common.UserDirectory(self.path, ttl_seconds=60))
+
+    def test_save_merges_entries_written_by_another_process(self):
+        first = slack_common.UserDirectory(self.path)
+        second = slack_common.UserDirectory(self.path)
+        first["U1"] = "Ana"
+        second["U2"] = "Bo"
+        first.save()
+        second.save()
+
+        merged = slack_common.UserDirectory(self.path)
+        self.assertEqual((merged["U1"], merged["U2"]), ("Ana", "Bo"))
+
+
+class _Response(io.BytesIO):
+    headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RequestSchedulerTests(unittest.TestCase):
+    def test_rate_limited_request_waits_for_retry_after_and_halves_concurrency(self):
+        responses = [
+            urllib.error.HTTPError("https://slack.com", 429, "Too Many Requests", {"Retry-After": "7"}, None),
+            _Response(json.dumps({"ok": True, "channel": {"id": "C1"}}).encode("utf-8")),
+        ]
+        scheduler = slack_common.RequestScheduler(proactive=False)
+        sleeps = []
+        clock = [100.0]
+
+        def fake_urlopen(req, timeout=None):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with mock.patch.object(slack_common, "_scheduler", scheduler), mock.patch.object(
+            slack_common.urllib.request, "urlopen", side_effect=fake_urlopen
+        ), mock.patch.object(slack_common.time, "monotonic", side_effect=lambda: clock[0]), mock.patch.object(
+            slack_common.time, "sleep", side_effect=sleeps.append
+        ):
+            payload = slack_common.api_call("conversations.info", "token", {"channel": "C1"})
+
+        self.assertEqual(payload["channel"]["id"], "C1")
+        self.assertEqual(sleeps, [7.0])
+        self.assertEqual(scheduler.limits["conversations.info"].limit, slack_common.MAX_IN_FLIGHT_PER_METHOD // 2)
+
+    def test_does_not_pace_below_tier_limits_unless_opted_in(self):
+        scheduler = slack_common.RequestScheduler()
+        with mock.patch.object(slack_common.time, "sleep") as sleep:
+            for _ in range(slack_common.TIER_LIMITS[3] + 10):
+                scheduler.call("conversations.info", lambda: {"ok": True})
+
+        sleep.assert_not_called()
+        with mock.patch.dict(slack_common.os.environ, {}, clear=True):
+            self.assertFalse(slack_common._proactive_rate_limits())
+        with mock.patch.dict(slack_common.os.environ, {"SLACK_PROACTIVE_RATE_LIMIT": "1"}):
+            self.assertTrue(slack_common._proactive_rate_limits())
+
+    def test_token_bucket_allows_a_minute_of_burst_then_paces_at_the_tier_rate(self):
+        with mock.patch.object(slack_common.time, "monotonic", return_value=0.0):
+            bucket = slack_common.TokenBucket(20)
+            delays = [bucket.take() for _ in range(21)]
+
+        self.assertEqual(delays[:20], [0.0] * 20)
+        self.assertAlmostEqual(delays[20], 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import importlib.util
+from importlib.machinery import SourceFileLoader
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+loader = SourceFileLoader("slack_export_dm", str(SCRIPT_DIR / "slack-export-dm"))
+spec = importlib.util.spec_from_loader("slack_export_dm", loader)
+slack_export_dm = importlib.util.module_from_spec(spec)
+assert spec.loader is not None
+spec.loader.exec_module(slack_export_dm)
+
+
+class SlackExportDmTests(unittest.TestCase):
+    def _day(self, ts):
+        return slack_export_dm._group_by_date([{"ts": ts}]).popitem()[0]
+
+    def test_merges_pages_and_replaces_stale_day_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            day = self._day("1700000000.000100")
+            stale = pathlib.Path(tmp) / f"{day}.json"
+            stale.write_text(json.dumps([{"ts": "1699999999.000000", "text": "old export"}]))
+
+            days = set()
+            slack_export_dm._merge_into_day_files(
+                tmp, [{"ts": "1700000000.000300", "reactions": [{"name": "x"}]}], days
+            )
+            slack_export_dm._merge_into_day_files(
+                tmp,
+                [{"ts": "1700000000.000100"}, {"ts": "1700000000.000300", "text": "edited"}],
+                days,
+            )
+
+            written = json.loads(stale.read_text())
+            self.assertEqual(days, {day})
+            self.assertEqual([m["ts"] for m in written], ["1700000000.000100", "1700000000.000300"])
+            self.assertEqual(written[1], {"ts": "1700000000.000300", "text": "edited"})
+
+    def test_resumes_history_cursor_and_pending_threads(self):
+        calls = []
+
+        def fake_api_call(method, token, params=None):
+            calls.append((method, dict(params or {})))
+            if method == "conversations.info":
+                return {"channel": {"id": "C1", "is_mpim": True, "name": "general"}}
+            if method == "conversations.history":
+                return {"messages": [{"ts": "1700000000.000200"}]}
+            if method == "conversations.replies":
+                return {"messages": [{"ts": params["ts"]}, {"ts": "1700000000.000150"}]}
+            raise AssertionError(method)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out_dir = pathlib.Path(tmp) / "general"
+            out_dir.mkdir()
+            day = self._day("1700000000.000100")
+            (out_dir / f"{day}.json").write_text(json.dumps([{"ts": "1700000000.000100"}]))
+            state = slack_export_dm._new_state(
+                {"channel_id": "C1", "oldest": None, "latest": None, "threads": True}
+            )
+            state.update(cursor="page-2", pending_threads=["1700000000.000100"], days=[day])
+            (out_dir / slack_export_dm.STATE_FILE).write_text(json.dumps(state))
+
+            argv = ["slack-export-dm", "--channel-id", "C1", "--output-dir", tmp]
+            with mock.patch.object(sys, "argv", argv), mock.patch.object(
+                slack_export_dm, "api_call", side_effect=fake_api_call
+            ), mock.patch.object(slack_export_dm, "get_token", return_value="fake-token"), mock.patch.object(
+                slack_export_dm, "load_user_cache"
+            ), mock.patch("builtins.print"):
+                slack_export_dm.main()
+
+            history = [params for method, params in calls if method == "conversations.history"]
+            self.assertEqual([params.get("cursor") for params in history], ["page-2"])
+            written = json.loads((out_dir / f"{day}.json").read_text())
+            self.assertEqual(
+                [m["ts"] for m in written],
+                ["1700000000.000100", "1700000000.000150", "1700000000.000200"],
+            )
+            meta = json.loads((out_dir / "_meta.json").read_text())
+            self.assertEqual(meta["messages"], 3)
+            self.assertTrue(meta["resumed"])
+            final_state = json.loads((out_dir / slack_export_dm.STATE_FILE).read_text())
+            self.assertTrue(final_state["complete"])
+            self.assertEqual(final_state["completed_threads"], ["1700000000.000100"])
+
+
+if __name__ == "__main__":
+    unittest.main()
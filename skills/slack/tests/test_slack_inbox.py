@@ -47,6 +47,69 @@ class SlackInboxTests(unittest.TestCase):
 
         self.assertFalse(slack_inbox._should_check_history(conv))
 
+    def test_collects_dm_and_author_user_ids_for_resolution(self):
+        rows = [
+            ({"id": "D1", "is_im": True, "user": "U1"}, {"user": "U2"}, 1, False),
+            ({"id": "C1", "is_im": False}, {"username": "bot"}, 2, False),
+            ({"id": "C2", "is_im": False}, {"user": "U1"}, 1, True),
+        ]
+
+        self.assertEqual(slack_inbox._user_ids_to_resolve(rows), ["U1", "U2", "U1"])
+
+    def test_incremental_reuses_watermark_only_while_activity_is_unchanged(self):
+        latest = {"ts": "1500", "text": "hi", "user": "U1"}
+        conv = {"id": "C1", "last_read": "1000", "updated": 1_600}
+        watermarks = {"C1": slack_inbox._watermark_entry(conv, latest, 2, False)}
+
+        self.assertEqual(slack_inbox._cached_history(conv, watermarks), (latest, 2, False))
+        self.assertIsNone(slack_inbox._cached_history({**conv, "updated": 1_700}, watermarks))
+        self.assertEqual(
+            slack_inbox._cached_history({**conv, "last_read": "1500"}, watermarks),
+            (None, 0, False),
+        )
+        self.assertIsNone(slack_inbox._cached_history({**conv, "last_read": "1200"}, watermarks))
+
+    def test_uses_server_counts_without_fetching_history(self):
+        latest = {"ts": "1500", "text": "hi", "user": "U1"}
+        conv = {"id": "C1", "last_read": "1000", "latest": latest, "unread_count_display": 7}
+
+        with mock.patch.object(slack_inbox, "api_call") as api_call:
+            result = slack_inbox._latest_unread(conv, "fake-token", "1000")
+
+        self.assertEqual(result, (latest, 7, False))
+        api_call.assert_not_called()
+
+    def test_read_up_to_latest_needs_no_history(self):
+        conv = {
+            "id": "C1",
+            "last_read": "1500",
+            "latest": {"ts": "1500", "text": "hi", "user": "U1"},
+            "unread_count_display": 2,
+        }
+
+        with mock.patch.object(slack_inbox, "api_call") as api_call:
+            result = slack_inbox._latest_unread(conv, "fake-token", "1500")
+
+        self.assertEqual(result, (None, 0, False))
+        api_call.assert_not_called()
+
+    def test_resolves_ignored_latest_with_small_history_fetch(self):
+        conv = {
+            "id": "C1",
+            "last_read": "1000",
+            "latest": {"ts": "1500", "subtype": "channel_join", "text": "joined"},
+            "unread_count_display": 3,
+        }
+        message = {"ts": "1400", "text": "hi", "user": "U1"}
+        payload = {"messages": [conv["latest"], message], "has_more": True}
+
+        with mock.patch.object(slack_inbox, "api_call", return_value=payload) as api_call:
+            result = slack_inbox._latest_unread(conv, "fake-token", "1000")
+
+        self.assertEqual(result, (message, 3, False))
+        params = api_call.call_args.args[2]
+        self.assertEqual(params["limit"], slack_inbox.COUNTED_HISTORY_LIMIT)
+
 
 if __name__ == "__main__":
     unittest.main()